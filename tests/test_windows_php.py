@@ -0,0 +1,117 @@
+# tests/test_windows_php.py
+
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+import zlib
+from unittest.mock import patch
+
+from unified_stack_manager.windows.legacy import php_manager as legacy_php
+from unified_stack_manager.windows.legacy.services.php import php_manager as services_php
+
+
+def _build_zip():
+    """Build a small PHP-like archive with every member kind the extractor routes differently."""
+    members = {
+        'php.exe': os.urandom(4096) + b'MZ' * 20000,
+        'ext/php_curl.dll': os.urandom(3000),
+        'inc/empty.h': b'',
+        '../evil.txt': b'outside',
+    }
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('dev/', b'')
+        zf.writestr('php.exe', members['php.exe'])
+        zf.writestr('ext/php_curl.dll', members['ext/php_curl.dll'], compress_type=zipfile.ZIP_STORED)
+        zf.writestr('inc/empty.h', members['inc/empty.h'])
+        zf.writestr('../evil.txt', members['../evil.txt'], compress_type=zipfile.ZIP_STORED)
+    return buf.getvalue(), members
+
+
+class TestPHPZipExtraction(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.data, self.members = _build_zip()
+        self.zip_path = os.path.join(self.tmp.name, 'php.zip')
+        with open(self.zip_path, 'wb') as f:
+            f.write(self.data)
+        self.php_path = os.path.join(self.tmp.name, 'php8.3')
+
+    def _extract(self):
+        services_php.PHPManager(base_path=self.tmp.name)._extract_parallel(self.zip_path, self.php_path)
+
+    def _assert_extracted(self):
+        for name in ('php.exe', 'ext/php_curl.dll', 'inc/empty.h'):
+            with open(os.path.join(self.php_path, name), 'rb') as f:
+                self.assertEqual(f.read(), self.members[name], name)
+        self.assertTrue(os.path.isdir(os.path.join(self.php_path, 'dev')))
+        # '..' members are sanitised by ZipFile.extract and stay inside php_path
+        with open(os.path.join(self.php_path, 'evil.txt'), 'rb') as f:
+            self.assertEqual(f.read(), self.members['../evil.txt'])
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['php.zip', 'php8.3'])
+
+    def test_extract_members(self):
+        """Test that stored, deflated, empty, directory and '..' members are extracted byte for byte."""
+        self._extract()
+        self._assert_extracted()
+
+    def test_extract_members_with_zlib(self):
+        """Test the same archive when libdeflate is not installed and zlib inflates the members."""
+        with patch.object(services_php, '_inflate_function',
+                          return_value=lambda data, size: zlib.decompress(data, -15, size)):
+            self._extract()
+        self._assert_extracted()
+
+    def test_extract_detects_crc_mismatch(self):
+        """Test that a corrupted member raises BadZipFile instead of writing bad bytes."""
+        with zipfile.ZipFile(io.BytesIO(self.data)) as zf:
+            info = zf.getinfo('ext/php_curl.dll')
+        corrupted = bytearray(self.data)
+        corrupted[info.header_offset + 30 + len(info.filename) + 10] ^= 0xFF
+        with open(self.zip_path, 'wb') as f:
+            f.write(corrupted)
+        with self.assertRaises(zipfile.BadZipFile):
+            self._extract()
+
+    def test_safe_member_parts(self):
+        """Test that '..' and drive components are routed to ZipFile.extract."""
+        self.assertEqual(services_php._safe_member_parts('ext\\php_curl.dll'), ['ext', 'php_curl.dll'])
+        self.assertIsNone(services_php._safe_member_parts('../evil.txt'))
+        self.assertIsNone(services_php._safe_member_parts('C:/Windows/evil.dll'))
+
+
+class TestPHPIniPatterns(unittest.TestCase):
+
+    def test_extension_line_pattern_crlf(self):
+        """Test that extension lines are removed whole from CRLF content."""
+        pattern = legacy_php._extension_line_pattern('mysqli')
+        content = "[PHP]\r\nextension=mysqli\r\n;extension=php_mysqli.dll\r\nextension=mysqlnd\r\n"
+        self.assertEqual(pattern.sub('', content), "[PHP]\r\nextension=mysqlnd\r\n")
+
+    def test_extension_line_pattern_without_trailing_newline(self):
+        """Test that the last line matches when the content has no trailing newline."""
+        pattern = legacy_php._extension_line_pattern('mysqli')
+        self.assertEqual(pattern.sub('', "[PHP]\nextension=mysqli.dll"), "[PHP]\n")
+        self.assertEqual(pattern.sub('', "[PHP]\r\nextension=mysqli\r"), "[PHP]\r\n")
+        self.assertEqual(pattern.sub('', "extension=mysqlix"), "extension=mysqlix")
+
+    def test_commented_extensions_pattern_crlf(self):
+        """Test that commented extensions are enabled and keep their CRLF endings."""
+        pattern = legacy_php._commented_extensions_pattern(('openssl', 'curl'))
+        content = ";extension=openssl\r\n;;extension=php_curl.dll  \r\n;extension=opensslx\r\n"
+        result, count = pattern.subn(r'\1', content)
+        self.assertEqual(count, 2)
+        self.assertEqual(result, "extension=openssl\r\nextension=php_curl.dll\r\n;extension=opensslx\r\n")
+
+    def test_commented_extensions_pattern_without_trailing_newline(self):
+        """Test that a commented extension on the last line is enabled."""
+        pattern = legacy_php._commented_extensions_pattern(('curl',))
+        self.assertEqual(pattern.sub(r'\1', "[PHP]\n; extension=curl"), "[PHP]\nextension=curl")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,318 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import functools
 import hashlib
+import io
+import mmap
 import os
 import shlex
+import socket
 import sys
 import json
 import argparse
 import subprocess
-import urllib.request
+import urllib.parse
 import zipfile
 import shutil
 import re
-from html.parser import HTMLParser
-from pathlib import Path
+from pathlib import PureWindowsPath
 import datetime
-from typing import Optional, Dict
-from urllib.error import URLError, HTTPError
+from typing import Optional, Dict, List, Iterable, Iterator
 
 from packaging import version
 
 import requests
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Directivas PHP/FastCGI sueltas que se eliminan de httpd.conf al reconfigurar
+_PHP_CONFIG_LINE_RE = re.compile(
+    r'LoadModule\s+(?:php_module|php7_module|fcgid_module)'
+    r'|PHPIniDir'
+    r'|LoadFile.*php.*ts\.dll'
+    r'|AddType.*application/x-httpd-php'
+    r'|FcgidInitialEnv'
+    r'|FcgidWrapper'
+    r'|AddHandler\s+fcgid-script'
+)
+
+# Literales presentes en toda línea que casa con _PHP_CONFIG_LINE_RE (prefiltro Aho-Corasick)
+_PHP_CONFIG_KEYWORDS = (
+    "PHPIniDir", "LoadFile", "FcgidInitialEnv", "FcgidWrapper", "fcgid-script",
+    "application/x-httpd-php", "php_module", "php7_module", "fcgid_module",
+)
+
+# Directivas mostradas por _show_php_configuration
+_IMPORTANT_PHP_CONFIGS = (
+    'memory_limit',
+    'max_execution_time',
+    'upload_max_filesize',
+    'post_max_size',
+    'max_file_uploads',
+    'date.timezone',
+    'error_reporting',
+    'display_errors',
+)
+# Directivas booleanas: ini_get() devuelve "" cuando están desactivadas
+_BOOLEAN_PHP_CONFIGS = frozenset({'display_errors'})
+
+# Directiva extension_dir de php.ini (se busca sobre bytes mapeados en memoria)
+_EXTDIR_RE = re.compile(rb"^extension_dir\s*=\s*[\"']?([^\"'\n\r]+)[\"']?", re.MULTILINE | re.IGNORECASE)
+# Carpetas de instalación con la versión en el nombre (php8.3, php83, php-7.4): evita lanzar php.exe
+_PHP_DIR_VERSION_RE = re.compile(r"^php-?(\d)\.?(\d)$", re.IGNORECASE)
+# Primera línea extension_dir de php.ini, comentada o no (solo [ \t] para no saltar de línea)
+_EXTENSION_DIR_LINE_RE = re.compile(r"^[ \t]*;?[ \t]*extension_dir[ \t]*=.*$", re.MULTILINE)
+
+# Argumentos para procesos no interactivos con salida capturada: sin stdin y, en Windows, sin crear consola
+_QUIET_SUBPROCESS_KWARGS = {
+    'stdin': subprocess.DEVNULL,
+    'creationflags': getattr(subprocess, 'CREATE_NO_WINDOW', 0),
+}
+
+# Vigencia (segundos) de la caché en disco de versiones PHP publicadas en windows.php.net
+_PHP_VERSIONS_CACHE_TTL = 6 * 3600
+
+# URLs estáticas por serie, usadas cuando el scraping de windows.php.net falla
+_FALLBACK_PHP_URLS = {
+    "7.1": "https://windows.php.net/downloads/releases/archives/php-7.1.9-Win32-VC14-x64.zip",
+    "7.3": "https://windows.php.net/downloads/releases/archives/php-7.3.9-Win32-VC15-x64.zip",
+    "7.4": "https://windows.php.net/downloads/releases/php-7.4.33-Win32-vs16-x64.zip",
+    "8.0": "https://windows.php.net/downloads/releases/php-8.0.30-Win32-vs16-x64.zip",
+    "8.1": "https://windows.php.net/downloads/releases/php-8.1.33-Win32-vs16-x64.zip",
+    "8.2": "https://windows.php.net/downloads/releases/php-8.2.29-Win32-vs16-x64.zip",
+    "8.3": "https://windows.php.net/downloads/releases/php-8.3.24-Win32-vs16-x64.zip",
+    "8.4": "https://windows.php.net/downloads/releases/php-8.4.0-Win32-vs16-x64.zip"
+}
+
+# Líneas de httpd.conf de una configuración PHP anterior (activas o comentadas); se aplica sobre bytes
+_PHP_APACHE_LINE_RE = re.compile(
+    rb'(LoadModule\s+php\d?_module|PHPIniDir|AddType\s+application/x-httpd-php|LoadFile\s+"?[^"\n]*php\d?ts\.dll)',
+    re.IGNORECASE
+)
+
+# LoadModule de mod_rewrite en httpd.conf: comentado y activo
+_REWRITE_COMMENTED_RE = re.compile(r'^[ \t]*#[ \t]*LoadModule[ \t]+rewrite_module\b[^\n]*mod_rewrite\.so[^\n]*$', re.MULTILINE)
+_REWRITE_ENABLED_RE = re.compile(r'^[ \t]*LoadModule[ \t]+rewrite_module[ \t]+modules/mod_rewrite\.so', re.MULTILINE)
+
+# Línea Include de httpd-vhosts.conf, activa o comentada (grupo 1 = comentario)
+_INCLUDE_VHOSTS_RE = re.compile(r'^\s*(#\s*)?Include\s+conf/extra/httpd-vhosts\.conf\b')
+
+# Enlace a un ZIP de PHP Thread Safe x64 en windows.php.net
+# (grupos: href, versión completa, serie mayor.menor)
+_PHP_HREF_RE = re.compile(
+    r'href=["\']([^"\']*/php-((\d+\.\d+)\.\d+)-Win32-v[sc]\d{2}-x64\.zip)["\']',
+    re.IGNORECASE
+)
+
+# Enlaces de la página de releases usados por scan_online_php_versions (grupos: archivo, serie mayor.menor)
+_SCAN_HREF_RE = re.compile(r'href="([^"]*php-(\d+\.\d+)\.\d+-Win32-vs\d+-x64\.zip)"')
+
+# Alias de mapping válido: alfanuméricos, guiones y guiones bajos
+_ALIAS_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+
+# Orden de preferencia para el PHP por defecto de Apache
+_PREFERRED_DEFAULT_PHP_VERSIONS = ("8.3", "8.2", "8.1", "8.0", "7.4", "7.1")
+
+# Módulos que se listan aparte como núcleo de PHP
+_CORE_MODULES = frozenset({'core', 'standard', 'pcre', 'spl', 'reflection'})
+
+# Script de "php -r" que reúne en un solo proceso versión, módulos cargados y directivas
+# (secciones separadas por "---"; sin comillas dobles para no complicar el escapado en Windows)
+_PHP_PROBE_SEPARATOR = "---"
+_PHP_PROBE_SCRIPT = (
+    "echo PHP_VERSION, PHP_EOL, PHP_SAPI, PHP_EOL, zend_version(), PHP_EOL;"
+    f"echo '{_PHP_PROBE_SEPARATOR}', PHP_EOL;"
+    "foreach (array_unique(array_merge(get_loaded_extensions(), get_loaded_extensions(true))) as $e)"
+    " echo $e, PHP_EOL;"
+    f"echo '{_PHP_PROBE_SEPARATOR}', PHP_EOL;"
+    f"foreach ([{', '.join(repr(config) for config in _IMPORTANT_PHP_CONFIGS)}] as $k)"
+    " echo $k, '=', ini_get($k), PHP_EOL;"
+)
+
+# Plantillas de httpd-vhosts.conf: un único VirtualHost con un Alias/Directory por mapping
+_VHOST_HEADER_TEMPLATE = (
+    "# Virtual Hosts generados por PHPVersionManager\n"
+    "# {timestamp}\n"
+    "\n"
+    "<VirtualHost *:80>\n"
+    "    ServerName localhost\n"
+    '    DocumentRoot "C:/APACHE24/htdocs"\n'
+    "\n"
+    '    <Directory "C:/APACHE24/htdocs">\n'
+    "        Options Indexes FollowSymLinks\n"
+    "        AllowOverride All\n"
+    "        Require all granted\n"
+    "    </Directory>\n"
+)
+_DIRECTORY_BLOCK_TEMPLATE = (
+    '    Alias /{alias} "{directory}"\n'
+    '    <Directory "{directory}">\n'
+    "        Options Indexes FollowSymLinks\n"
+    "        AllowOverride All\n"
+    "        Require all granted\n"
+    "{php_handler}"
+    "    </Directory>\n"
+)
+_PHP_HANDLER_TEMPLATE = (
+    "        # Configuración PHP\n"
+    "        <FilesMatch \\.php$>\n"
+    "            SetHandler fcgid-script\n"
+    '            FcgidWrapper "{cgi_exe}" .php\n'
+    "            Options +ExecCGI\n"
+    "        </FilesMatch>\n"
+)
+_VHOST_FOOTER = (
+    "    ErrorLog logs/vhosts_error.log\n"
+    "    CustomLog logs/vhosts_access.log common\n"
+    "</VirtualHost>\n"
+)
+
+# Versión de Composer en la salida de "composer --version"
+_COMPOSER_VERSION_RE = re.compile(r'Composer version (\S+)')
+_COMPOSER_VERSIONS_URL = "https://getcomposer.org/versions"
+# Tamaño razonable del instalador composer-setup.php (~60 KB): fuera de este rango se descarta sin hashear
+_COMPOSER_SETUP_MIN_SIZE = 16 * 1024
+_COMPOSER_SETUP_MAX_SIZE = 512 * 1024
+
+_PHP_CONFIG_BEGIN_MARKER = "# Configuración PHP multi-versión - INICIO"
+_PHP_CONFIG_END_MARKER = "# Configuración PHP multi-versión - FIN"
+
+# Progreso de descargas: intervalo mínimo entre refrescos y tamaño mínimo para mostrarlo
+_PROGRESS_INTERVAL = 0.2
+_PROGRESS_MIN_SIZE = 512 * 1024
+_DOWNLOAD_BUFFER_SIZE = 256 * 1024
+# Los ZIP de PHP (~30 MB) se descargan en memoria; solo si superan este tamaño pasan a un temporal en disco
+_PHP_ZIP_SPOOL_SIZE = 64 * 1024 * 1024
+# Miembros del ZIP por debajo de este tamaño comprimido se extraen en el hilo principal
+_ZIP_SMALL_MEMBER_SIZE = 64 * 1024
+
+# Secuencias ANSI de print_colored (colores desconocidos, p. ej. "white", usan el reset)
+_COLORS = {
+    'red': '\033[91m',
+    'green': '\033[92m',
+    'yellow': '\033[93m',
+    'blue': '\033[94m',
+    'magenta': '\033[95m',
+    'cyan': '\033[96m',
+    'gray': '\033[90m',
+    'dark_gray': '\033[2m',
+    'reset': '\033[0m'
+}
+_RESET = _COLORS['reset']
+
+# Bytes leídos de un módulo para validar sus cabeceras DOS/PE
+_PE_HEADER_WINDOW = 512
+
+# --command: metacaracteres y órdenes internas que solo entiende cmd.exe (esos comandos siguen pasando por el shell)
+_SHELL_METACHARACTERS = frozenset('|&<>^%')
+_CMD_BUILTINS = frozenset({
+    'assoc', 'call', 'cd', 'chdir', 'cls', 'copy', 'del', 'dir', 'echo', 'erase', 'ftype', 'md', 'mkdir',
+    'mklink', 'move', 'path', 'rd', 'ren', 'rename', 'rmdir', 'set', 'start', 'type', 'ver', 'vol',
+})
+
+
+@functools.lru_cache(maxsize=None)
+def _php_config_line_matcher():
+    """Devuelve el predicado que detecta directivas PHP sueltas (con pyahocorasick si está instalado)"""
+    try:
+        import ahocorasick
+    except ImportError:
+        return _PHP_CONFIG_LINE_RE.search
+
+    automaton = ahocorasick.Automaton()
+    for keyword in _PHP_CONFIG_KEYWORDS:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+
+    def matches(line):
+        # Una pasada del autómata descarta casi todas las líneas; la regex solo confirma candidatas
+        return next(automaton.iter(line), None) is not None and _PHP_CONFIG_LINE_RE.search(line) is not None
+
+    return matches
+
+
+@functools.lru_cache(maxsize=128)
+def _extension_line_pattern(extension):
+    """Regex (compilada una vez por extensión) de las líneas extension=... de php.ini, salto de línea incluido"""
+    # Coincide con: extension=mysqli, extension=mysqli.dll, ;extension=php_mysqli.dll, etc.
+    # Solo [ \t] como espacio para que un match nunca se extienda a las líneas vecinas; admite finales CRLF
+    escaped = re.escape(extension)
+    return re.compile(
+        rf"^[ \t]*;?[ \t]*extension[ \t]*=[ \t]*(?:{escaped}(?:\.dll)?|php_{escaped}\.dll)[ \t]*\r?(?:\n|\Z)",
+        re.IGNORECASE | re.MULTILINE
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def _commented_extensions_pattern(extensions):
+    """Regex única (por tupla de extensiones) de las líneas ;extension=... comentadas de php.ini"""
+    # Grupo 1: la directiva sin el comentario; grupo 'ext': el nombre de la extensión
+    # (un \r final queda fuera del match: las líneas CRLF conservan su terminación)
+    names = '|'.join(map(re.escape, extensions))
+    return re.compile(
+        rf"^[ \t]*;[; \t]*(extension[ \t]*=[ \t]*(?:php_)?(?P<ext>{names})(?:\.dll)?)[ \t]*(?=\r?$)",
+        re.IGNORECASE | re.MULTILINE
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _php_short_version(php_exe, mtime):
+    """Versión "X.Y" de un php.exe; la mtime forma parte de la clave para invalidar si se reemplaza el binario"""
+    result = subprocess.run(
+        [php_exe, "-r", "echo substr(PHP_VERSION, 0, 3);"],
+        capture_output=True, text=True, check=True, **_QUIET_SUBPROCESS_KWARGS
+    )
+    return result.stdout.strip()
+
+
+@functools.lru_cache(maxsize=8)
+def _apache_config_test(apache_bin, config_state):
+    """(returncode, stdout, stderr) de "httpd -t"; config_state ((mtime, tamaño) de los .conf) invalida la caché"""
+    result = subprocess.run(
+        [apache_bin, "-t"], capture_output=True, text=True, timeout=30, **_QUIET_SUBPROCESS_KWARGS
+    )
+    return result.returncode, result.stdout, result.stderr
+
+
+def _warm_dns(host, port=443):
+    """Resuelve host en un hilo daemon para que la primera conexión encuentre la caché DNS del sistema caliente"""
+    def resolve():
+        try:
+            socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            pass  # La conexión real informará del error
+
+    threading.Thread(target=resolve, name="dns-warmup", daemon=True).start()
+
+
+@functools.lru_cache(maxsize=None)
+def _php_info_pool():
+    """Pool de hilos compartido (creado en el primer uso) para lanzar "php -v" en segundo plano"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="php-info")
+
+
+class _ProgressWriter:
+    """Envuelve un destino de escritura contando bytes y notificando el progreso por tiempo"""
+
+    def __init__(self, target, total_size, report):
+        self.target = target
+        self.total_size = total_size
+        self.written = 0
+        # Solo se informa del progreso en descargas grandes con tamaño conocido
+        self.report = report if total_size > _PROGRESS_MIN_SIZE else None
+        self._next_tick = time.monotonic() + _PROGRESS_INTERVAL
+
+    def write(self, data):
+        result = self.target.write(data)
+        self.written += len(data)
+        if self.report is not None:
+            now = time.monotonic()
+            if now >= self._next_tick:
+                self.report(self.written, self.total_size)
+                self._next_tick = now + _PROGRESS_INTERVAL
+        return result
 
 
 class PHPVersionManager:
@@ -32,6 +324,8 @@ class PHPVersionManager:
         self.modules_path = os.path.join(self.apache_root, "modules")
         self.vhosts_path = "C:\\APACHE24\\conf\\extra\\httpd-vhosts.conf"
         self.mappings_file = "C:\\APACHE24\\conf\\php-mappings.json"
+        # Caché de mappings: (mtime_ns, tamaño, dict normalizado, aliases ordenados)
+        self._mappings_cache = None
 
         # Versiones disponibles (Thread Safe)
         self.available_versions = {
@@ -48,29 +342,93 @@ class PHPVersionManager:
 
         self.remote_php_versions = None
 
+        # Tiempo máximo (segundos) para sondear un ejecutable PHP; uno sano responde en <100ms
+        self.php_probe_timeout = 1
+
+        # php-cgi.exe resuelto por ruta de PHP (None si no existe), se comprueba una vez por ejecución
+        self._php_cgi_cache = {}
+
+        # PHP por defecto de Apache (None = sin calcular, "" = ninguna versión válida)
+        self._default_php_version = None
+
+        # Estadísticas del último vhosts escrito (ver _render_vhost), para validarlo sin releerlo
+        self._vhost_stats = None
+
+        # Resultado de _probe_php por ejecutable (dict, None si falló o la excepción a relanzar)
+        self._php_probe_cache = {}
+
+        # Caché en disco de los escaneos de windows.php.net (ver _cached_scan)
+        self.php_versions_cache_file = os.path.join(os.path.expanduser("~"), ".usm", "php_versions.json")
+        self.php_versions_cache_ttl = _PHP_VERSIONS_CACHE_TTL
+        self._php_versions_cache_lock = threading.Lock()
+
+        # Información de la versión activa (se recalcula solo en set_php_version)
+        self._active_php_info_cache = None
+
+        # Sesión HTTP compartida para windows.php.net (reutiliza conexión TLS keep-alive)
+        self._http_session = None
+
+        # Última versión estable de Composer (se consulta una vez por ejecución)
+        self._composer_latest = None
+        self._composer_latest_lock = threading.Lock()
+
         # Composer
         self.default_composer_versions = {v: "2.8.10" for v in self.available_versions}
 
         # Extensiones necesarias
         self.required_extensions = ["openssl", "mbstring", "curl", "intl", "mysqli", "gd", "pdo_mysql"]
 
-    def print_colored(self, text, color, end="\n"):
-        """Imprime texto con color"""
-        colors = {
-            'red': '\033[91m',
-            'green': '\033[92m',
-            'yellow': '\033[93m',
-            'blue': '\033[94m',
-            'magenta': '\033[95m',
-            'cyan': '\033[96m',
-            'gray': '\033[90m',
-            'dark_gray': '\033[2m',
-            'reset': '\033[0m'
-        }
+        # Solo se emiten secuencias ANSI si la salida es una terminal
+        self._colorize = sys.stdout is not None and sys.stdout.isatty()
+
+        # Buffer de salida por hilo (ver _run_buffered); sin él se escribe en stdout
+        self._local = threading.local()
 
-        color_code = colors.get(color, colors['reset'])
-        reset_code = colors['reset']
-        print(f"{color_code}{text}{reset_code}", end=end)
+    def print_colored(self, text, color, end="\n", buf=None):
+        """Imprime texto con color (o lo acumula en buf si se indica)"""
+        if self._colorize:
+            line = f"{_COLORS.get(color, _RESET)}{text}{_RESET}{end}"
+        else:
+            line = f"{text}{end}"
+        if buf is None:
+            buf = getattr(self._local, 'buf', None) or sys.stdout
+        buf.write(line)
+
+    def print_colored_segments(self, segments, end="\n", buf=None):
+        """Imprime en una sola escritura una línea formada por varios segmentos (texto, color)"""
+        if self._colorize:
+            line = "".join(f"{_COLORS.get(color, _RESET)}{text}" for text, color in segments) + f"{_RESET}{end}"
+        else:
+            line = "".join(text for text, _ in segments) + end
+        if buf is None:
+            buf = getattr(self._local, 'buf', None) or sys.stdout
+        buf.write(line)
+
+    def _print_block(self, lines) -> None:
+        """Imprime un bloque de líneas (texto, color) con una única escritura en stdout"""
+        buf = io.StringIO()
+        for text, color in lines:
+            self.print_colored(text, color, buf=buf)
+
+        thread_buf = getattr(self._local, 'buf', None)
+        if thread_buf is not None:
+            thread_buf.write(buf.getvalue())
+        else:
+            sys.stdout.write(buf.getvalue())
+            sys.stdout.flush()
+
+    def _run_buffered(self, func, *args):
+        """Ejecuta func acumulando en un buffer propio del hilo la salida de print_colored
+
+        Returns:
+            tuple: (resultado de func, texto acumulado)
+        """
+        buf = io.StringIO()
+        self._local.buf = buf
+        try:
+            return func(*args), buf.getvalue()
+        finally:
+            self._local.buf = None
 
     def show_help(self):
         """Muestra la ayuda completa del PHP Version Manager"""
@@ -130,8 +488,8 @@ class PHPVersionManager:
             if os.path.exists(php_exe):
                 try:
                     # Obtener información de la versión de PHP
-                    result = subprocess.run([php_exe, "-v"], capture_output=True, text=True, timeout=10,
-                                            stderr=subprocess.DEVNULL)
+                    result = subprocess.run([php_exe, "-v"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                            text=True, timeout=10, **_QUIET_SUBPROCESS_KWARGS)
                     if result.returncode == 0:
                         version_info = result.stdout.split('\n')[0]
 
@@ -147,7 +505,8 @@ class PHPVersionManager:
                             try:
                                 comp_result = subprocess.run(
                                     [php_exe, composer_phar, "--version", "--no-ansi"],
-                                    capture_output=True, text=True, timeout=10, stderr=subprocess.DEVNULL
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=10,
+                                    **_QUIET_SUBPROCESS_KWARGS
                                 )
                                 if comp_result.returncode == 0 and comp_result.stdout.strip():
                                     composer_parts = comp_result.stdout.split()
@@ -267,10 +626,11 @@ class PHPVersionManager:
         try:
             result = subprocess.run(
                 [php_exe, "-m"],
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
                 text=True,
                 timeout=10,
-                stderr=subprocess.DEVNULL
+                **_QUIET_SUBPROCESS_KWARGS
             )
             if result.returncode == 0:
                 extensions = []
@@ -372,10 +732,15 @@ class PHPVersionManager:
 
     def get_php_mappings(self) -> Optional[Dict]:
         """Obtiene los mappings de PHP con validación completa de estructura"""
+        cached = self._mappings_cache
+        if cached is not None and cached[:2] == self._mappings_file_key():
+            return cached[2]
+
         self.initialize_php_mappings()
 
         try:
             with open(self.mappings_file, 'r', encoding='utf-8') as f:
+                st = os.fstat(f.fileno())
                 content = f.read().strip()
 
             if not content:
@@ -417,6 +782,8 @@ class PHPVersionManager:
                         self.print_colored(f"⚠️  Mapping '{name}' tiene formato incorrecto, saltando...", "yellow")
                         continue
 
+            sorted_aliases = sorted(hash_structure["mappings"], key=str.lower)
+            self._mappings_cache = (st.st_mtime_ns, st.st_size, hash_structure, sorted_aliases)
             return hash_structure
 
         except json.JSONDecodeError as e:
@@ -432,8 +799,25 @@ class PHPVersionManager:
             self.print_colored(f"❌ Error inesperado leyendo mappings: {e}", "red")
             return None
 
+    def _mappings_file_key(self):
+        """Devuelve (mtime_ns, tamaño) del archivo de mappings, o None si no existe"""
+        try:
+            st = os.stat(self.mappings_file)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _sorted_aliases(self, mappings_data):
+        """Devuelve los aliases ordenados, reutilizando el orden precalculado de la caché"""
+        cached = self._mappings_cache
+        if cached is not None and cached[2]["mappings"] is mappings_data:
+            return cached[3]
+        return sorted(mappings_data, key=str.lower)
+
     def save_php_mappings(self, mappings: Dict) -> bool:
         """Guarda los mappings de PHP con validación completa"""
+        # El dict en caché puede haber sido modificado por el llamador
+        self._mappings_cache = None
         try:
             # Validar entrada
             if not isinstance(mappings, dict):
@@ -653,8 +1037,7 @@ class PHPVersionManager:
             return False
 
         # Solo permitir caracteres alfanuméricos, guiones y guiones bajos
-        import re
-        if not re.match(r'^[a-zA-Z0-9_-]+$', alias):
+        if not _ALIAS_RE.match(alias):
             return False
 
         # No permitir que empiece o termine con guión
@@ -698,10 +1081,10 @@ class PHPVersionManager:
             self.print_colored(f"❌ Alias no encontrado: {alias}", "red")
 
             # Mostrar aliases disponibles si hay alguno
-            available_aliases = list(mappings.get("mappings", {}).keys())
+            available_aliases = self._sorted_aliases(mappings.get("mappings", {}))
             if available_aliases:
                 self.print_colored("   Aliases disponibles:", "yellow")
-                for available_alias in sorted(available_aliases):
+                for available_alias in available_aliases:
                     self.print_colored(f"     - {available_alias}", "gray")
             else:
                 self.print_colored("   No hay mappings configurados", "gray")
@@ -737,16 +1120,15 @@ class PHPVersionManager:
         if not mappings:
             return False
 
-        removed = []
-        not_found = []
+        present = mappings.setdefault("mappings", {})
+        wanted = {alias.strip() for alias in aliases}
 
-        for alias in aliases:
-            alias = alias.strip()
-            if alias in mappings.get("mappings", {}):
-                del mappings["mappings"][alias]
-                removed.append(alias)
-            else:
-                not_found.append(alias)
+        # Intersección/diferencia de conjuntos en lugar de comprobar alias por alias
+        removed = sorted(wanted & present.keys(), key=str.lower)
+        not_found = sorted(wanted - present.keys(), key=str.lower)
+
+        for alias in removed:
+            del present[alias]
 
         if removed:
             if self.save_php_mappings(mappings):
@@ -772,26 +1154,36 @@ class PHPVersionManager:
             self.print_colored("No se pudieron cargar los mappings.", "red")
             return
 
-        self.print_colored("=== Mappings de Directorios a Versiones PHP ===", "green")
-        print()
-
         mappings_data = mappings.get("mappings", {})
 
         if not mappings_data:
+            self.print_colored("=== Mappings de Directorios a Versiones PHP ===", "green")
+            print()
             self.print_colored("No hay mappings configurados.", "yellow")
             print()
             self._show_usage_examples()
             return
 
+        # Acumular toda la salida y volcarla de una sola vez al final
+        buf = io.StringIO()
+        self.print_colored("=== Mappings de Directorios a Versiones PHP ===", "green", buf=buf)
+        self.print_colored("", "white", buf=buf)
+
+        # Verificar una sola vez cada directorio y cada PHP distintos
+        statuses = self._collect_mapping_statuses(mappings_data)
+
         # Calcular estadísticas
-        stats = self._calculate_mapping_stats(mappings_data)
-        self._show_statistics(stats)
+        stats = self._calculate_mapping_stats(mappings_data, statuses)
+        self._show_statistics(stats, buf)
 
         # Mostrar mappings detallados
-        self._show_detailed_mappings(mappings_data)
+        self._show_detailed_mappings(mappings_data, buf, statuses)
 
         # Mostrar información del archivo
-        self._show_file_info(mappings)
+        self._show_file_info(mappings, buf)
+
+        sys.stdout.write(buf.getvalue())
+        sys.stdout.flush()
 
     def _show_usage_examples(self):
         """Muestra ejemplos de uso cuando no hay mappings"""
@@ -802,8 +1194,25 @@ class PHPVersionManager:
         self.print_colored("  python php_manager.py -d 'C:\\www\\legacy' -v 7.4 -a legacy", "gray")
         self.print_colored("  python php_manager.py -d 'C:\\www\\modern' -v 8.3 -a modern", "gray")
 
-    def _calculate_mapping_stats(self, mappings_data):
+    def _collect_mapping_statuses(self, mappings_data):
+        """Verifica cada directorio y ruta PHP distintos una sola vez (PHP en paralelo)"""
+        unique_dirs = {config.get('directory', '') for config in mappings_data.values()}
+        unique_php = list({config.get('phpPath', '') for config in mappings_data.values()})
+
+        dir_statuses = {directory: self._check_directory_status(directory) for directory in unique_dirs}
+
+        # Cada verificación de PHP lanza un proceso: se solapan en hilos
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(unique_php)))) as executor:
+            php_statuses = dict(zip(unique_php, executor.map(self._check_php_status, unique_php)))
+
+        return dir_statuses, php_statuses
+
+    def _calculate_mapping_stats(self, mappings_data, statuses=None):
         """Calcula estadísticas de los mappings"""
+        if statuses is None:
+            statuses = self._collect_mapping_statuses(mappings_data)
+        dir_statuses, php_statuses = statuses
+
         stats = {
             'total': len(mappings_data),
             'valid': 0,
@@ -813,15 +1222,9 @@ class PHPVersionManager:
             'php_execution_issues': 0
         }
 
-        for alias, config in mappings_data.items():
-            directory = config.get('directory', '')
-            php_path = config.get('phpPath', '')
-
-            # Verificar directorio
-            dir_status = self._check_directory_status(directory)
-
-            # Verificar PHP
-            php_status = self._check_php_status(php_path)
+        for config in mappings_data.values():
+            dir_status = dir_statuses[config.get('directory', '')]
+            php_status = php_statuses[config.get('phpPath', '')]
 
             # Actualizar estadísticas
             if dir_status['exists'] and php_status['exists']:
@@ -876,51 +1279,58 @@ class PHPVersionManager:
         if status['exists']:
             try:
                 result = subprocess.run([php_exe, "--version"],
-                                        capture_output=True, text=True, timeout=5)
+                                        capture_output=True, text=True, timeout=self.php_probe_timeout,
+                                        **_QUIET_SUBPROCESS_KWARGS)
                 if result.returncode == 0:
                     status['executable'] = True
                     status['version_info'] = result.stdout.split('\n')[0]
                 else:
                     status['execution_issue'] = True
+            except subprocess.TimeoutExpired:
+                # PHP colgado (p. ej. diálogo de runtime VC ausente): no bloquear el listado
+                status['execution_issue'] = True
             except Exception:
                 status['execution_issue'] = True
 
         return status
 
-    def _show_statistics(self, stats):
+    def _show_statistics(self, stats, buf=None):
         """Muestra las estadísticas generales"""
-        self.print_colored(f"📊 Estadísticas generales:", "yellow")
-        self.print_colored(f"   Total mappings: {stats['total']}", "white")
+        self.print_colored(f"📊 Estadísticas generales:", "yellow", buf=buf)
+        self.print_colored(f"   Total mappings: {stats['total']}", "white", buf=buf)
 
         if stats['valid'] > 0:
-            self.print_colored(f"   ✅ Válidos: {stats['valid']}", "green")
+            self.print_colored(f"   ✅ Válidos: {stats['valid']}", "green", buf=buf)
 
         if stats['invalid_dirs'] > 0:
-            self.print_colored(f"   📁❌ Directorios no encontrados: {stats['invalid_dirs']}", "red")
+            self.print_colored(f"   📁❌ Directorios no encontrados: {stats['invalid_dirs']}", "red", buf=buf)
 
         if stats['invalid_php'] > 0:
-            self.print_colored(f"   🐘❌ PHP no encontrado: {stats['invalid_php']}", "red")
+            self.print_colored(f"   🐘❌ PHP no encontrado: {stats['invalid_php']}", "red", buf=buf)
 
         if stats['permission_issues'] > 0:
-            self.print_colored(f"   🔐 Problemas de permisos: {stats['permission_issues']}", "yellow")
+            self.print_colored(f"   🔐 Problemas de permisos: {stats['permission_issues']}", "yellow", buf=buf)
 
         if stats['php_execution_issues'] > 0:
-            self.print_colored(f"   ⚙️ Problemas de ejecución PHP: {stats['php_execution_issues']}", "yellow")
+            self.print_colored(f"   ⚙️ Problemas de ejecución PHP: {stats['php_execution_issues']}", "yellow", buf=buf)
 
-        print()
+        self.print_colored("", "white", buf=buf)
 
-    def _show_detailed_mappings(self, mappings_data):
+    def _show_detailed_mappings(self, mappings_data, buf=None, statuses=None):
         """Muestra los mappings detallados ordenados por alias"""
-        self.print_colored("📋 Mappings detallados:", "yellow")
-        print()
+        if statuses is None:
+            statuses = self._collect_mapping_statuses(mappings_data)
+
+        self.print_colored("📋 Mappings detallados:", "yellow", buf=buf)
+        self.print_colored("", "white", buf=buf)
 
-        for alias in sorted(mappings_data.keys(), key=str.lower):
+        for alias in self._sorted_aliases(mappings_data):
             config = mappings_data[alias]
-            self._show_single_mapping(alias, config)
+            self._show_single_mapping(alias, config, buf, statuses)
 
-    def _show_single_mapping(self, alias, config):
+    def _show_single_mapping(self, alias, config, buf=None, statuses=None):
         """Muestra un mapping individual con todas sus verificaciones"""
-        self.print_colored(f"📁 {alias}", "cyan")
+        self.print_colored(f"📁 {alias}", "cyan", buf=buf)
 
         # Información básica
         directory = config.get('directory', 'N/A')
@@ -928,80 +1338,86 @@ class PHPVersionManager:
         php_path = config.get('phpPath', 'N/A')
         created = config.get('created', 'N/A')
 
-        self.print_colored(f"   📂 Directorio: {directory}", "gray")
-        self.print_colored(f"   🐘 PHP: {version} ({php_path})", "gray")
-        self.print_colored(f"   📅 Creado: {created}", "dark_gray")
+        self.print_colored(f"   📂 Directorio: {directory}", "gray", buf=buf)
+        self.print_colored(f"   🐘 PHP: {version} ({php_path})", "gray", buf=buf)
+        self.print_colored(f"   📅 Creado: {created}", "dark_gray", buf=buf)
 
-        # Verificaciones detalladas
-        dir_status = self._check_directory_status(directory)
-        php_status = self._check_php_status(php_path)
+        # Verificaciones detalladas (compartidas entre mappings con las mismas rutas)
+        if statuses is None:
+            statuses = self._collect_mapping_statuses({alias: config})
+        dir_status = statuses[0][config.get('directory', '')]
+        php_status = statuses[1][config.get('phpPath', '')]
 
         # Mostrar estado del directorio
-        self._show_directory_status(dir_status, directory)
+        self._show_directory_status(dir_status, directory, buf)
 
         # Mostrar estado de PHP
-        self._show_php_status(php_status, php_path)
+        self._show_php_status(php_status, php_path, buf)
 
         # Estado general del mapping
-        self._show_mapping_overall_status(dir_status, php_status)
+        self._show_mapping_overall_status(dir_status, php_status, buf)
 
-        print()
+        self.print_colored("", "white", buf=buf)
 
-    def _show_directory_status(self, dir_status, directory):
+    def _show_directory_status(self, dir_status, directory, buf=None):
         """Muestra el estado detallado del directorio"""
         if not directory or directory == 'N/A':
-            self.print_colored("   📂❌ Directorio no especificado", "red")
+            self.print_colored("   📂❌ Directorio no especificado", "red", buf=buf)
             return
 
         if not dir_status['exists']:
-            self.print_colored("   📂❌ Directorio no encontrado", "red")
+            self.print_colored("   📂❌ Directorio no encontrado", "red", buf=buf)
         elif not dir_status['is_dir']:
-            self.print_colored("   📂⚠️  La ruta no es un directorio", "red")
+            self.print_colored("   📂⚠️  La ruta no es un directorio", "red", buf=buf)
         elif not dir_status['readable']:
-            self.print_colored("   📂⚠️  Sin permisos de lectura en directorio", "yellow")
+            self.print_colored("   📂⚠️  Sin permisos de lectura en directorio", "yellow", buf=buf)
         else:
-            self.print_colored("   📂✅ Directorio accesible", "green")
+            self.print_colored("   📂✅ Directorio accesible", "green", buf=buf)
 
-    def _show_php_status(self, php_status, php_path):
+    def _show_php_status(self, php_status, php_path, buf=None):
         """Muestra el estado detallado de PHP"""
         if not php_path or php_path == 'N/A':
-            self.print_colored("   🐘❌ Ruta PHP no especificada", "red")
+            self.print_colored("   🐘❌ Ruta PHP no especificada", "red", buf=buf)
             return
 
         if not php_status['exists']:
-            self.print_colored("   🐘❌ PHP no encontrado", "red")
+            self.print_colored("   🐘❌ PHP no encontrado", "red", buf=buf)
         elif php_status['execution_issue']:
-            self.print_colored("   🐘⚠️  Error verificando/ejecutando PHP", "yellow")
+            self.print_colored("   🐘⚠️  Error verificando/ejecutando PHP", "yellow", buf=buf)
         elif php_status['executable'] and php_status['version_info']:
-            self.print_colored(f"   🐘✅ {php_status['version_info']}", "green")
+            self.print_colored(f"   🐘✅ {php_status['version_info']}", "green", buf=buf)
         else:
-            self.print_colored("   🐘⚠️  PHP no ejecuta correctamente", "yellow")
+            self.print_colored("   🐘⚠️  PHP no ejecuta correctamente", "yellow", buf=buf)
 
-    def _show_mapping_overall_status(self, dir_status, php_status):
+    def _show_mapping_overall_status(self, dir_status, php_status, buf=None):
         """Muestra el estado general del mapping"""
         if (dir_status['exists'] and dir_status['is_dir'] and dir_status['readable'] and
                 php_status['exists'] and php_status['executable']):
-            self.print_colored("   🎯 Mapping completamente funcional", "green")
+            self.print_colored("   🎯 Mapping completamente funcional", "green", buf=buf)
         elif dir_status['exists'] and php_status['exists']:
-            self.print_colored("   🔧 Mapping parcialmente funcional", "yellow")
+            self.print_colored("   🔧 Mapping parcialmente funcional", "yellow", buf=buf)
         else:
-            self.print_colored("   💥 Mapping no funcional", "red")
+            self.print_colored("   💥 Mapping no funcional", "red", buf=buf)
 
-    def _show_file_info(self, mappings):
+    def _show_file_info(self, mappings, buf=None):
         """Muestra información sobre el archivo de mappings"""
-        self.print_colored("📄 Información del archivo:", "yellow")
-        self.print_colored(f"   📍 Ubicación: {self.mappings_file}", "gray")
-        self.print_colored(f"   📅 Creado: {mappings.get('created', 'N/A')}", "gray")
-        self.print_colored(f"   🔄 Actualizado: {mappings.get('updated', 'Nunca')}", "gray")
-        self.print_colored(f"   📋 Versión: {mappings.get('version', 'N/A')}", "gray")
+        self.print_colored("📄 Información del archivo:", "yellow", buf=buf)
+        self.print_colored(f"   📍 Ubicación: {self.mappings_file}", "gray", buf=buf)
+        self.print_colored(f"   📅 Creado: {mappings.get('created', 'N/A')}", "gray", buf=buf)
+        self.print_colored(f"   🔄 Actualizado: {mappings.get('updated', 'Nunca')}", "gray", buf=buf)
+        self.print_colored(f"   📋 Versión: {mappings.get('version', 'N/A')}", "gray", buf=buf)
 
-        # Información adicional del archivo
+        # Información adicional del archivo (de la caché si corresponde a estos mappings)
         try:
-            file_stat = os.stat(self.mappings_file)
-            file_size = file_stat.st_size
-            last_modified = datetime.fromtimestamp(file_stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-            self.print_colored(f"   📏 Tamaño: {file_size} bytes", "gray")
-            self.print_colored(f"   🕒 Última modificación: {last_modified}", "gray")
+            cached = self._mappings_cache
+            if cached is not None and cached[2] is mappings:
+                mtime_ns, file_size = cached[0], cached[1]
+            else:
+                file_stat = os.stat(self.mappings_file)
+                mtime_ns, file_size = file_stat.st_mtime_ns, file_stat.st_size
+            last_modified = datetime.datetime.fromtimestamp(mtime_ns / 1e9).strftime('%Y-%m-%d %H:%M:%S')
+            self.print_colored(f"   📏 Tamaño: {file_size} bytes", "gray", buf=buf)
+            self.print_colored(f"   🕒 Última modificación: {last_modified}", "gray", buf=buf)
         except Exception:
             pass  # Si no se puede obtener info del archivo, no es crítico
 
@@ -1009,51 +1425,33 @@ class PHPVersionManager:
         """Instala mod_fcgid automáticamente descargándolo desde ApacheLounge"""
         self.print_colored("📥 Instalando mod_fcgid automáticamente...", "yellow")
 
-        if not os.path.exists(apache_modules_path):
-            self.print_colored(f"❌ Directorio de módulos de Apache no encontrado: {apache_modules_path}", "red")
-            return False
-
         mod_fcgid_path = os.path.join(apache_modules_path, "mod_fcgid.so")
-        zip_filename = "mod_fcgid-2.3.10-win64-VS17.zip"
-        temp_dir = None
 
         try:
             # ✅ URL CORRECTA
             download_url = "https://www.apachelounge.com/download/VS17/modules/mod_fcgid-2.3.10-win64-VS17.zip"
 
-            # Directorio temporal
-            temp_dir = tempfile.mkdtemp(prefix="mod_fcgid_")
-            zip_path = os.path.join(temp_dir, zip_filename)
+            # El ZIP (~300KB) se mantiene en memoria: sin directorio temporal
+            zip_data = io.BytesIO()
 
             # 1. Descargar
-            if not self._download_mod_fcgid(download_url, zip_path):
+            if not self._download_mod_fcgid(download_url, zip_data):
                 return False
 
-            # 2. Descomprimir y encontrar mod_fcgid.so
-            mod_fcgid_source = self._extract_and_find_mod_fcgid(zip_path, temp_dir)
-            if not mod_fcgid_source:
+            # 2. Extraer mod_fcgid.so directamente en Apache
+            if not self._extract_mod_fcgid(zip_data, mod_fcgid_path):
                 return False
-
-            # 3. Copiar a Apache
-            shutil.copy2(mod_fcgid_source, mod_fcgid_path)
             self.print_colored(f"✅ mod_fcgid.so copiado a: {mod_fcgid_path}", "green")
 
-            # 4. Verificar instalación
+            # 3. Verificar instalación
             return self._verify_mod_fcgid_installation(mod_fcgid_path)
 
         except Exception as e:
             self.print_colored(f"❌ Error instalando mod_fcgid: {str(e)}", "red")
             return False
-        finally:
-            # Limpiar temporal
-            if temp_dir and os.path.exists(temp_dir):
-                try:
-                    shutil.rmtree(temp_dir)
-                except Exception:
-                    pass
 
-    def _download_mod_fcgid(self, url, zip_path):
-        """Descarga el archivo mod_fcgid desde ApacheLounge"""
+    def _download_mod_fcgid(self, url, zip_data):
+        """Descarga el archivo mod_fcgid desde ApacheLounge en el buffer zip_data"""
 
         # 🔒 Validación crítica: asegurarse de que la URL es externa
         if not url.startswith("http"):
@@ -1068,39 +1466,21 @@ class PHPVersionManager:
         self.print_colored(f"   URL: {url}", "gray")
 
         try:
-            # ⚠️ Añadir User-Agent (algunos servidores bloquean requests sin él)
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
+            # La sesión compartida ya envía User-Agent (algunos servidores bloquean requests sin él)
+            with self._get_http_session().get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
 
-            response = requests.get(url, stream=True, headers=headers, timeout=30)
-            response.raise_for_status()
+                total_size = int(response.headers.get('content-length', 0))
+                writer = _ProgressWriter(zip_data, total_size, self._print_download_progress)
 
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded_size = 0
+                # Copia en bloques grandes desde el socket (descomprimiendo gzip/deflate si aplica)
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, writer, length=_DOWNLOAD_BUFFER_SIZE)
 
-            # Crear directorio si no existe
-            os.makedirs(os.path.dirname(zip_path), exist_ok=True)
-
-            with open(zip_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-
-                        if total_size > 0 and downloaded_size % (100 * 1024) == 0:
-                            percent = (downloaded_size / total_size) * 100
-                            self.print_colored(
-                                f"\r   Progreso: {percent:.1f}% ({downloaded_size}/{total_size} bytes)", "cyan", end=""
-                            )
-
-            print()  # Nueva línea
-
-            if not os.path.exists(zip_path):
-                self.print_colored("❌ Error: No se creó el archivo ZIP", "red")
-                return False
+            if writer.report is not None:
+                print()  # Nueva línea
 
-            file_size = os.path.getsize(zip_path)
+            file_size = zip_data.tell()
             if file_size == 0:
                 self.print_colored("❌ Error: El archivo descargado está vacío", "red")
                 return False
@@ -1122,119 +1502,106 @@ class PHPVersionManager:
             self.print_colored(f"❌ Error inesperado: {str(e)}", "red")
             return False
 
-    def _extract_and_find_mod_fcgid(self, zip_path, temp_dir):
-        """Descomprime el ZIP y busca el archivo mod_fcgid.so"""
+    def _print_download_progress(self, downloaded_size, total_size):
+        """Muestra una línea de progreso de descarga sobrescribiendo la anterior"""
+        percent = (downloaded_size / total_size) * 100
+        self.print_colored(f"\r   Progreso: {percent:.1f}% ({downloaded_size}/{total_size} bytes)", "cyan", end="")
+
+    def _extract_mod_fcgid(self, zip_data, mod_fcgid_path):
+        """Busca mod_fcgid.so en el ZIP y lo escribe en mod_fcgid_path (vía un temporal, nunca a medias)"""
 
         self.print_colored("📦 Descomprimiendo archivo...", "yellow")
 
+        # Temporal junto al módulo; solo se renombra sobre mod_fcgid.so si la extracción termina bien
+        tmp_path = mod_fcgid_path + ".tmp"
+
         try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            # Buscar mod_fcgid.so en la estructura descomprimida
-            mod_fcgid_source = None
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    if file == "mod_fcgid.so":
-                        mod_fcgid_source = os.path.join(root, file)
-                        break
-                if mod_fcgid_source:
-                    break
+            with zipfile.ZipFile(zip_data, 'r') as zip_ref:
+                # Localizar mod_fcgid.so en el índice del ZIP y extraer solo ese miembro
+                target = next((name for name in zip_ref.namelist()
+                               if name.rsplit('/', 1)[-1] == "mod_fcgid.so"), None)
+
+                if not target:
+                    self.print_colored("❌ Error: mod_fcgid.so no encontrado en el archivo ZIP", "red")
+                    self.print_colored("📁 Contenido del ZIP:", "gray")
+                    self._show_zip_contents(zip_ref)
+                    return False
 
-            if not mod_fcgid_source:
-                self.print_colored("❌ Error: mod_fcgid.so no encontrado en el archivo ZIP", "red")
-                self.print_colored("📁 Contenido del ZIP:", "gray")
-                self._show_zip_contents(temp_dir)
-                return None
+                self.print_colored(f"✅ mod_fcgid.so encontrado en: {target}", "green")
+                with zip_ref.open(target) as src, open(tmp_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, length=64 * 1024)
 
-            self.print_colored(f"✅ mod_fcgid.so encontrado en: {mod_fcgid_source}", "green")
-            return mod_fcgid_source
+            os.replace(tmp_path, mod_fcgid_path)
+            return True
 
+        except FileNotFoundError:
+            self.print_colored(f"❌ Directorio de módulos de Apache no encontrado: {os.path.dirname(mod_fcgid_path)}",
+                               "red")
+            return False
+        except PermissionError:
+            self.print_colored(f"❌ Error: Sin permisos de escritura en: {os.path.dirname(mod_fcgid_path)}", "red")
+            self.print_colored("   💡 Ejecuta el script como administrador", "yellow")
+            return False
         except zipfile.BadZipFile:
             self.print_colored("❌ Error: El archivo descargado no es un ZIP válido", "red")
-            return None
+            return False
         except Exception as e:
             self.print_colored(f"❌ Error descomprimiendo archivo: {str(e)}", "red")
-            return None
+            return False
+        finally:
+            # CRC incorrecto, disco lleno...: no dejar un módulo truncado
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
-    def _show_zip_contents(self, temp_dir):
-        """Muestra el contenido del directorio descomprimido para debugging"""
+    def _show_zip_contents(self, zip_ref):
+        """Muestra el contenido del ZIP (sin descomprimirlo) para debugging"""
 
         try:
-            for root, dirs, files in os.walk(temp_dir):
-                level = root.replace(temp_dir, '').count(os.sep)
-                indent = '  ' * level
-                rel_path = os.path.relpath(root, temp_dir)
-                if rel_path != '.':
-                    self.print_colored(f"{indent}📁 {rel_path}/", "dark_gray")
-
-                sub_indent = '  ' * (level + 1)
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    file_size = os.path.getsize(file_path)
-                    self.print_colored(f"{sub_indent}📄 {file} ({file_size:,} bytes)", "dark_gray")
+            for info in zip_ref.infolist():
+                parts = info.filename.rstrip('/').split('/')
+                indent = '  ' * len(parts)
+                if info.is_dir():
+                    self.print_colored(f"{indent}📁 {parts[-1]}/", "dark_gray")
+                else:
+                    self.print_colored(f"{indent}📄 {parts[-1]} ({info.file_size:,} bytes)", "dark_gray")
         except Exception:
             self.print_colored("   (No se pudo mostrar el contenido)", "dark_gray")
 
-    def _copy_mod_fcgid(self, source_path, destination_path):
-        """Copia mod_fcgid.so al directorio de módulos de Apache"""
-
-        self.print_colored("📁 Copiando mod_fcgid.so a Apache modules...", "yellow")
-        self.print_colored(f"   Origen: {source_path}", "gray")
-        self.print_colored(f"   Destino: {destination_path}", "gray")
+    def _verify_mod_fcgid_installation(self, mod_fcgid_path):
+        """Verifica que mod_fcgid.so se instaló correctamente"""
 
         try:
-            # Verificar que el archivo origen existe
-            if not os.path.exists(source_path):
-                self.print_colored(f"❌ Error: Archivo origen no encontrado: {source_path}", "red")
-                return False
-
-            # Verificar permisos de escritura en el directorio destino
-            dest_dir = os.path.dirname(destination_path)
-            if not os.access(dest_dir, os.W_OK):
-                self.print_colored(f"❌ Error: Sin permisos de escritura en: {dest_dir}", "red")
-                self.print_colored("   💡 Ejecuta el script como administrador", "yellow")
-                return False
-
-            # Realizar la copia
-            shutil.copy2(source_path, destination_path)
-
-            return True
-
-        except PermissionError:
-            self.print_colored("❌ Error: Sin permisos para copiar el archivo", "red")
-            self.print_colored("   💡 Ejecuta el script como administrador", "yellow")
-            return False
-        except Exception as e:
-            self.print_colored(f"❌ Error copiando archivo: {str(e)}", "red")
+            with open(mod_fcgid_path, 'rb') as f:
+                file_size = os.fstat(f.fileno()).st_size
+                header = f.read(_PE_HEADER_WINDOW)
+        except OSError:
+            self.print_colored("❌ Error: No se pudo copiar mod_fcgid.so", "red")
             return False
 
-    def _verify_mod_fcgid_installation(self, mod_fcgid_path):
-        """Verifica que mod_fcgid.so se instaló correctamente"""
-
-        if os.path.exists(mod_fcgid_path):
-            file_size = os.path.getsize(mod_fcgid_path)
-            self.print_colored(f"✅ mod_fcgid.so instalado correctamente ({file_size:,} bytes)", "green")
+        # Verificaciones adicionales
+        if file_size == 0:
+            return self._discard_invalid_mod_fcgid(mod_fcgid_path, "El archivo instalado está vacío")
 
-            # Verificaciones adicionales
-            if file_size == 0:
-                self.print_colored("⚠️  Advertencia: El archivo instalado está vacío", "yellow")
-                return False
+        # Verificar las firmas PE de la DLL: "MZ" al inicio y "PE\0\0" en e_lfanew
+        view = memoryview(header)
+        pe_offset = int.from_bytes(view[0x3C:0x40], 'little') if len(view) >= 0x40 else -1
+        if view[:2] != b'MZ' or not 0 <= pe_offset <= len(view) - 4 or view[pe_offset:pe_offset + 4] != b'PE\0\0':
+            return self._discard_invalid_mod_fcgid(mod_fcgid_path, "El archivo no es un módulo PE válido")
 
-            # Verificar que es un archivo binario (debe contener bytes no ASCII)
-            try:
-                with open(mod_fcgid_path, 'rb') as f:
-                    first_bytes = f.read(10)
-                    if not any(b > 127 for b in first_bytes):
-                        self.print_colored("⚠️  Advertencia: El archivo no parece ser un módulo binario válido",
-                                           "yellow")
-            except Exception:
-                pass  # Ignorar errores de verificación
+        self.print_colored(f"✅ mod_fcgid.so instalado correctamente ({file_size:,} bytes)", "green")
+        return True
 
-            return True
-        else:
-            self.print_colored("❌ Error: No se pudo copiar mod_fcgid.so", "red")
-            return False
+    def _discard_invalid_mod_fcgid(self, mod_fcgid_path, reason):
+        """Borra un mod_fcgid.so inválido para que la próxima ejecución lo vuelva a instalar; siempre devuelve False"""
+        self.print_colored(f"❌ Error: {reason}", "red")
+        try:
+            os.remove(mod_fcgid_path)
+        except OSError as e:
+            self.print_colored(f"   ⚠️  No se pudo eliminar {mod_fcgid_path}: {e}", "yellow")
+            self.print_colored("   💡 Elimínalo manualmente antes de volver a instalar mod_fcgid", "yellow")
+        return False
 
     def setup_apache_multiversion(self) -> bool:
         """
@@ -1328,19 +1695,23 @@ class PHPVersionManager:
     def _process_apache_configuration(self) -> bool:
         """Procesa y actualiza la configuración de Apache"""
 
+        tmp_path = None
+
         try:
-            # Leer configuración actual
-            with open(self.apache_conf, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.readlines()
+            # Procesar en streaming: leer, filtrar y escribir a un temporal en el mismo directorio
+            with open(self.apache_conf, 'r', encoding='utf-8', errors='ignore') as src, \
+                    tempfile.NamedTemporaryFile('w', encoding='utf-8', delete=False,
+                                                dir=os.path.dirname(self.apache_conf)) as tmp:
+                tmp_path = tmp.name
 
-            # Procesar contenido
-            new_content = self._remove_existing_php_config(content)
-            new_content = self._add_fastcgi_configuration(new_content)
-            new_content = self._enable_virtual_hosts(new_content)
+                lines = self._remove_existing_php_config(src)
+                lines = self._add_fastcgi_configuration(lines)
+                lines = self._enable_virtual_hosts(lines)
+                tmp.writelines(lines)
 
-            # Guardar nueva configuración
-            with open(self.apache_conf, 'w', encoding='utf-8') as f:
-                f.writelines(new_content)
+            # Reemplazar la configuración de forma atómica
+            os.replace(tmp_path, self.apache_conf)
+            tmp_path = None
 
             self.print_colored("✅ Configuración Apache actualizada para soporte multi-versión", "green")
             return True
@@ -1349,44 +1720,47 @@ class PHPVersionManager:
             self.print_colored(f"❌ Error procesando configuración: {str(e)}", "red")
             return False
 
-    def _remove_existing_php_config(self, content: list) -> list:
+        finally:
+            # Limpiar temporal si algo salió mal antes del reemplazo
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _remove_existing_php_config(self, lines: Iterable[str]) -> Iterator[str]:
         """Remueve configuración PHP anterior"""
 
-        new_content = []
         skip_php_section = False
+        is_php_line = _php_config_line_matcher()
 
-        for line in content:
+        for line in lines:
             # Detectar secciones de configuración PHP
-            if "# Configuración PHP multi-versión - INICIO" in line:
+            stripped = line.lstrip()
+            if stripped.startswith(_PHP_CONFIG_BEGIN_MARKER):
                 skip_php_section = True
                 continue
 
-            if "# Configuración PHP multi-versión - FIN" in line:
+            if stripped.startswith(_PHP_CONFIG_END_MARKER):
                 skip_php_section = False
                 continue
 
             if not skip_php_section:
-                # Remover líneas PHP sueltas usando expresiones regulares más precisas
-                if (re.search(r'LoadModule\s+(php_module|php7_module|fcgid_module)', line) or
-                        re.search(r'PHPIniDir', line) or
-                        re.search(r'LoadFile.*php.*ts\.dll', line) or
-                        re.search(r'AddType.*application/x-httpd-php', line) or
-                        re.search(r'FcgidInitialEnv', line) or
-                        re.search(r'FcgidWrapper', line) or
-                        re.search(r'AddHandler\s+fcgid-script', line)):
+                # Remover líneas PHP sueltas
+                if is_php_line(line):
                     continue
 
-                new_content.append(line)
-
-        return new_content
+                yield line
 
-    def _add_fastcgi_configuration(self, content: list) -> list:
+    def _add_fastcgi_configuration(self, lines: Iterable[str]) -> Iterator[str]:
         """Añade configuración FastCGI optimizada"""
 
-        # Añadir configuración FastCGI
-        fastcgi_config = [
+        yield from lines
+
+        # Añadir configuración FastCGI al final
+        yield from [
             "\n",
-            "# Configuración PHP multi-versión - INICIO\n",
+            f"{_PHP_CONFIG_BEGIN_MARKER}\n",
             "# Generado automáticamente por PHPVersionManager\n",
             f"# {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
             "\n",
@@ -1409,35 +1783,55 @@ class PHPVersionManager:
         ]
 
         # Configurar PHP por defecto
-        default_php_config = self._get_default_php_configuration()
-        if default_php_config:
-            fastcgi_config.extend(default_php_config)
+        yield from self._get_default_php_configuration()
 
-        fastcgi_config.extend([
-            "# Configuración PHP multi-versión - FIN\n",
+        yield from [
+            f"{_PHP_CONFIG_END_MARKER}\n",
             "\n"
-        ])
+        ]
+
+    @staticmethod
+    def _posix(path: str) -> str:
+        """Convierte una ruta de Windows al formato con / que espera Apache"""
+        return PureWindowsPath(path).as_posix()
 
-        content.extend(fastcgi_config)
-        return content
+    def _get_php_cgi(self, php_path: str) -> Optional[str]:
+        """Devuelve la ruta de php-cgi.exe (con /) para php_path o None si no existe (memoizado)"""
+        try:
+            return self._php_cgi_cache[php_path]
+        except KeyError:
+            pass
+
+        php_cgi = os.path.join(php_path, "php-cgi.exe")
+        resolved = self._posix(php_cgi) if os.path.isfile(php_cgi) else None
+        self._php_cgi_cache[php_path] = resolved
+        return resolved
+
+    def _get_default_php_version(self) -> str:
+        """Devuelve la primera versión preferida con php-cgi.exe ("" si ninguna), calculada una vez"""
+        if self._default_php_version is None:
+            self._default_php_version = next(
+                (version for version in _PREFERRED_DEFAULT_PHP_VERSIONS
+                 if version in self.available_versions
+                 and self._get_php_cgi(self.available_versions[version])),
+                ""
+            )
+        return self._default_php_version
 
     def _get_default_php_configuration(self) -> list:
         """Obtiene configuración para PHP por defecto"""
 
         # Buscar PHP por defecto (8.3 preferido)
-        preferred_versions = ["8.3", "8.2", "8.1", "8.0", "7.4", "7.1"]
+        default_version = self._get_default_php_version()
 
-        for version in preferred_versions:
+        for version in _PREFERRED_DEFAULT_PHP_VERSIONS:
             if version in self.available_versions:
                 php_path = self.available_versions[version]
-                php_cgi = os.path.join(php_path, "php-cgi.exe")
 
-                if os.path.exists(php_cgi):
+                if version == default_version:
+                    php_cgi_forward = self._get_php_cgi(php_path)
                     self.print_colored(f"✅ Configurando PHP {version} como versión por defecto", "green")
 
-                    # ✅ Usa as_posix() para convertir ruta a formato con /
-                    php_cgi_forward = Path(php_cgi).as_posix()
-
                     return [
                         f"# PHP por defecto ({version})\n",
                         f'# FcgidInitialEnv PHPRC "{php_path}"\n',
@@ -1449,37 +1843,45 @@ class PHPVersionManager:
                         "\n"
                     ]
                 else:
-                    self.print_colored(f"⚠️  php-cgi.exe no encontrado para PHP {version} en: {php_cgi}", "yellow")
+                    missing = os.path.join(php_path, "php-cgi.exe")
+                    self.print_colored(f"⚠️  php-cgi.exe no encontrado para PHP {version} en: {missing}", "yellow")
 
         self.print_colored("⚠️  No se encontró ninguna versión de PHP válida para configuración por defecto", "yellow")
         return []
 
-    def _enable_virtual_hosts(self, content: list) -> list:
+    def _enable_virtual_hosts(self, lines: Iterable[str]) -> Iterator[str]:
         """Habilita virtual hosts si no está habilitado"""
 
         vhost_line = "Include conf/extra/httpd-vhosts.conf"
+        enabled = False
 
-        # Verificar si ya está habilitado
-        for line in content:
-            if re.search(rf'^{re.escape(vhost_line)}', line.strip()):
-                return content  # Ya está habilitado
+        for line in lines:
+            # Un único match anclado por línea (admite espacios/tabuladores variables)
+            match = _INCLUDE_VHOSTS_RE.match(line)
 
-        # Buscar línea comentada y descomentarla
-        for i, line in enumerate(content):
-            if re.search(r'^#\s*Include\s+conf/extra/httpd-vhosts\.conf', line):
-                content[i] = re.sub(r'^#\s*', '', line)
-                self.print_colored("✅ Habilitado archivo de Virtual Hosts", "green")
-                return content
+            if match is not None:
+                # Verificar si ya está habilitado
+                if match.group(1) is None:
+                    if enabled:
+                        continue  # Ya se habilitó antes (evitar Include duplicado)
+                    enabled = True
 
-        # Si no se encuentra comentada, añadir al final
-        content.extend([
-            "\n",
-            "# Virtual Hosts habilitado por PHPVersionManager\n",
-            f"{vhost_line}\n"
-        ])
-        self.print_colored("✅ Añadido archivo de Virtual Hosts", "green")
+                # Línea comentada: descomentarla
+                elif not enabled:
+                    line = line.lstrip().lstrip('#').lstrip()
+                    enabled = True
+                    self.print_colored("✅ Habilitado archivo de Virtual Hosts", "green")
 
-        return content
+            yield line
+
+        # Si no se encuentra comentada, añadir al final
+        if not enabled:
+            yield from [
+                "\n",
+                "# Virtual Hosts habilitado por PHPVersionManager\n",
+                f"{vhost_line}\n"
+            ]
+            self.print_colored("✅ Añadido archivo de Virtual Hosts", "green")
 
     def _verify_apache_configuration(self) -> bool:
         """Verifica que la configuración de Apache sea válida"""
@@ -1487,21 +1889,17 @@ class PHPVersionManager:
         self.print_colored("🔍 Verificando configuración...", "yellow")
 
         try:
-            # Ejecutar test de configuración de Apache
-            result = subprocess.run(
-                [self.apache_bin, "-t"],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            # Si ni httpd.conf ni vhosts han cambiado, Apache no necesita volver a parsearlos
+            config_state = self._config_file_key(self.apache_conf) + self._config_file_key(self.vhosts_path)
+            returncode, stdout, stderr = _apache_config_test(self.apache_bin, config_state)
 
-            if result.returncode == 0:
+            if returncode == 0:
                 self.print_colored("✅ Configuración Apache válida", "green")
 
                 # Mostrar información adicional si está disponible
-                if result.stdout.strip():
+                if stdout.strip():
                     self.print_colored("📋 Información adicional:", "gray")
-                    for line in result.stdout.strip().split('\n'):
+                    for line in stdout.strip().split('\n'):
                         self.print_colored(f"   {line}", "dark_gray")
 
                 return True
@@ -1509,12 +1907,12 @@ class PHPVersionManager:
                 self.print_colored("❌ Error en configuración Apache:", "red")
 
                 # Mostrar errores detallados
-                if result.stderr:
-                    for line in result.stderr.strip().split('\n'):
+                if stderr:
+                    for line in stderr.strip().split('\n'):
                         self.print_colored(f"  {line}", "red")
 
-                if result.stdout:
-                    for line in result.stdout.strip().split('\n'):
+                if stdout:
+                    for line in stdout.strip().split('\n'):
                         self.print_colored(f"  {line}", "red")
 
                 return False
@@ -1529,6 +1927,15 @@ class PHPVersionManager:
             self.print_colored(f"❌ Error verificando configuración: {str(e)}", "red")
             return False
 
+    @staticmethod
+    def _config_file_key(path: str) -> tuple:
+        """(mtime_ns, tamaño) de un archivo de configuración, (None, None) si no existe"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return (None, None)
+        return (st.st_mtime_ns, st.st_size)
+
     def _show_configuration_summary(self) -> None:
         """Muestra un resumen de la configuración aplicada"""
 
@@ -1538,50 +1945,60 @@ class PHPVersionManager:
         self.print_colored("   🌐 Virtual Hosts: habilitado", "gray")
 
         # Mostrar PHP por defecto configurado
-        for version in ["8.4", "8.3", "8.2", "8.1", "8.0", "7.4", "7.1"]:
-            if version in self.available_versions:
-                php_path = self.available_versions[version]
-                php_cgi = os.path.join(php_path, "php-cgi.exe")
-                if os.path.exists(php_cgi):
-                    self.print_colored(f"   🐘 PHP por defecto: {version} ({php_path})", "gray")
-                    break
+        default_version = self._get_default_php_version()
+        if default_version:
+            php_path = self.available_versions[default_version]
+            self.print_colored(f"   🐘 PHP por defecto: {default_version} ({php_path})", "gray")
 
         self.print_colored("\n💡 Siguiente paso: Configurar Virtual Hosts para proyectos específicos", "cyan")
 
-    def update_virtual_hosts(self):
+    def update_virtual_hosts(self) -> bool:
         """Actualiza los virtual hosts en un solo VirtualHost con Alias"""
         self.print_colored("🔧 Actualizando Virtual Hosts...", "yellow")
+        self._vhost_stats = None
         mappings = self.get_php_mappings()
         if not mappings:
-            return
+            return False
+
+        # Una sola marca de tiempo para el backup y la cabecera de esta ejecución
+        now = datetime.datetime.now()
+
+        # Orden de los aliases (el mismo que usa el resumen), calculado una sola vez
+        sorted_aliases = self._sorted_aliases(mappings.get("mappings", {}))
 
         # Backup si existe
-        if os.path.exists(self.vhosts_path):
-            backup_vhost = f"{self.vhosts_path}.backup.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
-            try:
-                shutil.copy2(self.vhosts_path, backup_vhost)
-                self.print_colored(f"📋 Backup de vhosts creado: {backup_vhost}", "gray")
-            except Exception as e:
-                self.print_colored(f"⚠️ Error creando backup: {e}", "yellow")
-
-        # Iniciar contenido
-        vhost_content = [
-            "# Virtual Hosts generados por PHPVersionManager",
-            f"# {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            "",
-            "<VirtualHost *:80>",
-            "    ServerName localhost",
-            '    DocumentRoot "C:/APACHE24/htdocs"',
-            "",
-            '    <Directory "C:/APACHE24/htdocs">',
-            "        Options Indexes FollowSymLinks",
-            "        AllowOverride All",
-            "        Require all granted",
-            "    </Directory>"
-        ]
+        self._create_vhosts_backup(now)
+
+        # Escribir directamente en el archivo (buffer de 64KB), sin lista intermedia ni join final
+        try:
+            os.makedirs(os.path.dirname(self.vhosts_path), exist_ok=True)
+            with open(self.vhosts_path, 'w', encoding='utf-8', buffering=1 << 16) as f:
+                self._vhost_stats = self._render_vhost(mappings, f, now, sorted_aliases)
+            self.print_colored(f"✅ Virtual Hosts actualizados: {self.vhosts_path}", "green")
+            return True
+        except Exception as e:
+            self.print_colored(f"❌ Error escribiendo vhosts: {e}", "red")
+            return False
+
+    def _render_vhost(self, mappings: dict, out, now: Optional[datetime.datetime] = None,
+                      sorted_aliases: Optional[list] = None) -> dict:
+        """Escribe en out el VirtualHost único con un Alias/Directory por mapping
+
+        Devuelve estadísticas de lo escrito (has_open_tag, has_close_tag, byte_count)
+        """
+        header = _VHOST_HEADER_TEMPLATE.format_map({
+            'timestamp': (now or datetime.datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+        })
+        out.write(header)
+        byte_count = len(header.encode('utf-8'))
+
+        mappings_data = mappings.get("mappings", {})
+        if sorted_aliases is None:
+            sorted_aliases = self._sorted_aliases(mappings_data)
 
         # Procesar cada mapping
-        for alias, config in sorted(mappings["mappings"].items()):
+        for alias in sorted_aliases:
+            config = mappings_data[alias]
             directory = config.get("directory", "")
             php_path = config.get("phpPath", "")
             version = config.get("version", "")
@@ -1590,57 +2007,37 @@ class PHPVersionManager:
                 self.print_colored(f"⚠️ Directorio no válido para {alias}: {directory}", "yellow")
                 continue
 
-            # Convertir rutas
-            dir_fixed = directory.replace("\\", "/")
-
-            # Alias
-            vhost_content.append(f'    Alias /{alias} "{dir_fixed}"')
-
-            # <Directory>
-            vhost_content.append(f'    <Directory "{dir_fixed}">')
-            vhost_content.append("        Options Indexes FollowSymLinks")
-            vhost_content.append("        AllowOverride All")
-            vhost_content.append("        Require all granted")
-
             # Configuración PHP si está disponible
+            php_handler = ""
             if php_path and version != "xampp":
-                cgi_exe = os.path.join(php_path, "php-cgi.exe").replace("\\", "/")
-                if os.path.exists(cgi_exe):
-                    vhost_content.extend([
-                        "        # Configuración PHP",
-                        "        <FilesMatch \\.php$>",
-                        "            SetHandler fcgid-script",
-                        f'            FcgidWrapper "{cgi_exe}" .php',
-                        "            Options +ExecCGI",
-                        "        </FilesMatch>"
-                    ])
-
-            vhost_content.append("    </Directory>")
-
-        # Logs generales
-        vhost_content.extend([
-            "    ErrorLog logs/vhosts_error.log",
-            "    CustomLog logs/vhosts_access.log common",
-            "</VirtualHost>"
-        ])
-
-        # Escribir archivo
-        try:
-            os.makedirs(os.path.dirname(self.vhosts_path), exist_ok=True)
-            with open(self.vhosts_path, 'w', encoding='utf-8') as f:
-                f.write("\n".join(vhost_content))
-            self.print_colored(f"✅ Virtual Hosts actualizados: {self.vhosts_path}", "green")
-        except Exception as e:
-            self.print_colored(f"❌ Error escribiendo vhosts: {e}", "red")
+                cgi_exe = self._get_php_cgi(php_path)
+                if cgi_exe:
+                    php_handler = _PHP_HANDLER_TEMPLATE.format_map({'cgi_exe': cgi_exe})
+
+            block = _DIRECTORY_BLOCK_TEMPLATE.format_map({
+                'alias': alias,
+                'directory': self._posix(directory),
+                'php_handler': php_handler,
+            })
+            out.write(block)
+            byte_count += len(block.encode('utf-8'))
+
+        out.write(_VHOST_FOOTER)
+        return {
+            'has_open_tag': "<VirtualHost" in header,
+            'has_close_tag': "</VirtualHost>" in _VHOST_FOOTER,
+            'byte_count': byte_count + len(_VHOST_FOOTER.encode('utf-8')),
+        }
 
-    def _create_vhosts_backup(self) -> bool:
+    def _create_vhosts_backup(self, now: Optional[datetime.datetime] = None) -> bool:
         """Crea backup del archivo de virtual hosts si existe"""
 
         if os.path.exists(self.vhosts_path):
             try:
-                timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+                timestamp = (now or datetime.datetime.now()).strftime('%Y%m%d-%H%M%S')
                 backup_path = f"{self.vhosts_path}.backup.{timestamp}"
-                shutil.copy2(self.vhosts_path, backup_path)
+                # Solo contenido (copia nativa del sistema); la fecha ya va en el nombre del backup
+                shutil.copyfile(self.vhosts_path, backup_path)
                 self.print_colored(f"📋 Backup VHosts creado: {backup_path}", "gray")
             except Exception as e:
                 self.print_colored(f"⚠️  Error creando backup: {str(e)}", "yellow")
@@ -1648,71 +2045,6 @@ class PHPVersionManager:
 
         return True
 
-    def _generate_vhost_content(self, mappings: dict) -> list:
-        """Genera el contenido completo de virtual hosts (un solo VirtualHost)"""
-        vhost_content = []
-        vhost_content.extend(self._get_vhost_header())
-
-        vhost_content.append("<VirtualHost *:80>")
-        vhost_content.append("    ServerName localhost")
-        vhost_content.append('    DocumentRoot "C:/APACHE24/htdocs"')
-
-        # Directorio raíz
-        vhost_content.append('    <Directory "C:/APACHE24/htdocs">')
-        vhost_content.append('        Options Indexes FollowSymLinks')
-        vhost_content.append('        AllowOverride All')
-        vhost_content.append('        Require all granted')
-        vhost_content.append('    </Directory>')
-
-        # Mappings (Alias + Directory)
-        mappings_data = mappings.get("mappings", {})
-        if mappings_data:
-            vhost_content.extend(self._get_mappings_vhosts(mappings_data))
-        else:
-            self.print_colored("ℹ️ No hay mappings configurados", "cyan")
-
-        # Logs generales
-        vhost_content.append('    ErrorLog logs/vhosts_error.log')
-        vhost_content.append('    CustomLog logs/vhosts_access.log common')
-        vhost_content.append("</VirtualHost>")
-
-        return vhost_content
-
-    def _get_vhost_header(self) -> list:
-        """Genera encabezado del archivo de virtual hosts"""
-
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        return [
-            "# Virtual Hosts generados automáticamente por PHPVersionManager\n",
-            f"# {timestamp}\n",
-            "#\n",
-            "# Este archivo es generado automáticamente. Los cambios manuales se perderán.\n",
-            "#\n",
-            "\n"
-        ]
-
-    def _get_php_config_for_vhost(self, php_path: str, php_version: str) -> list:
-        """Genera configuración PHP específica para un virtual host"""
-        if not php_path or php_version == "xampp":
-            return []
-
-        php_cgi_exe = os.path.join(php_path, "php-cgi.exe")
-        if not os.path.exists(php_cgi_exe):
-            self.print_colored(f"⚠️ php-cgi.exe no encontrado: {php_cgi_exe}", "yellow")
-            return []
-
-        # ✅ Convertir ruta a formato con barras normales
-        cgi_forward = php_cgi_exe.replace('\\', '/')
-
-        return [
-            f"        # PHP {php_version} para este proyecto",
-            "        <FilesMatch \\.php$>",
-            "            SetHandler fcgid-script",
-            f'            FcgidWrapper "{cgi_forward}" .php',  # ✅ Aquí se arregla
-            "            Options +ExecCGI",
-            "        </FilesMatch>"
-        ]
-
     def _write_vhost_file(self, content: list) -> bool:
         """Escribe el contenido al archivo de virtual hosts"""
 
@@ -1735,7 +2067,7 @@ class PHPVersionManager:
             self.print_colored(f"❌ Error escribiendo archivo VHosts: {str(e)}", "red")
             return False
 
-    def _show_vhosts_summary(self, mappings: dict) -> None:
+    def _show_vhosts_summary(self, mappings: dict, sorted_aliases: Optional[list] = None) -> None:
         """Muestra resumen de virtual hosts configurados"""
 
         mappings_data = mappings.get("mappings", {})
@@ -1744,49 +2076,66 @@ class PHPVersionManager:
             self.print_colored("ℹ️  Solo se configuró el Virtual Host por defecto", "cyan")
             return
 
-        self.print_colored("🌐 Virtual Hosts configurados:", "cyan")
+        block = [
+            ("🌐 Virtual Hosts configurados:", "cyan"),
+            # VHost por defecto
+            ("   http://localhost/ (por defecto)", "yellow"),
+        ]
 
-        # Mostrar VHost por defecto
-        self.print_colored("   http://localhost/ (por defecto)", "yellow")
+        if sorted_aliases is None:
+            sorted_aliases = self._sorted_aliases(mappings_data)
 
         # Mostrar cada mapping
-        for alias in sorted(mappings_data.keys(), key=str.lower):
+        for alias in sorted_aliases:
             config = mappings_data[alias]
             php_version = config.get('version', 'N/A')
             directory = config.get('directory', 'N/A')
 
-            self.print_colored(f"   http://localhost/{alias} (PHP {php_version})", "yellow")
-            self.print_colored(f"     📁 {directory}", "gray")
+            block.append((f"   http://localhost/{alias} (PHP {php_version})", "yellow"))
+            block.append((f"     📁 {directory}", "gray"))
 
             # Verificar estado del directorio
             if directory and directory != 'N/A':
                 if os.path.exists(directory):
-                    self.print_colored("     ✅ Directorio accesible", "green")
+                    block.append(("     ✅ Directorio accesible", "green"))
                 else:
-                    self.print_colored("     ❌ Directorio no encontrado", "red")
+                    block.append(("     ❌ Directorio no encontrado", "red"))
 
-    def _validate_vhost_configuration(self) -> bool:
-        """Valida la configuración de virtual hosts generada"""
+        self._print_block(block)
+
+    def _validate_vhost_configuration(self, stats: Optional[dict] = None) -> bool:
+        """Valida la configuración de virtual hosts generada
+
+        Con las estadísticas de _render_vhost no hace falta releer el archivo
+        """
 
         if not os.path.exists(self.vhosts_path):
             self.print_colored("❌ Archivo de Virtual Hosts no fue creado", "red")
             return False
 
         try:
-            # Verificar que el archivo no esté vacío y tenga contenido válido
-            with open(self.vhosts_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            file_size = os.path.getsize(self.vhosts_path)
 
-            if not content.strip():
+            if stats is None:
+                # Sin estadísticas en memoria: leer el archivo
+                with open(self.vhosts_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                stats = {
+                    'has_open_tag': "<VirtualHost" in content,
+                    'has_close_tag': "</VirtualHost>" in content,
+                    'byte_count': len(content.strip()),
+                }
+
+            # Verificar que el archivo no esté vacío y tenga contenido válido
+            if not file_size or not stats['byte_count']:
                 self.print_colored("❌ Archivo de Virtual Hosts está vacío", "red")
                 return False
 
             # Verificaciones básicas de sintaxis
-            if not ("<VirtualHost" in content and "</VirtualHost>" in content):
+            if not (stats['has_open_tag'] and stats['has_close_tag']):
                 self.print_colored("❌ Archivo de Virtual Hosts no contiene configuración válida", "red")
                 return False
 
-            file_size = os.path.getsize(self.vhosts_path)
             self.print_colored(f"✅ Archivo VHosts válido ({file_size} bytes)", "green")
             return True
 
@@ -1804,7 +2153,7 @@ class PHPVersionManager:
 
         if success:
             # Validar configuración generada
-            if self._validate_vhost_configuration():
+            if self._validate_vhost_configuration(self._vhost_stats):
                 self.print_colored("🎯 Virtual Hosts actualizados y validados correctamente", "green")
                 return True
             else:
@@ -1850,21 +2199,16 @@ class PHPVersionManager:
         """Muestra información de versión de PHP"""
 
         try:
-            result = subprocess.run([php_exe, "-v"],
-                                    capture_output=True, text=True, timeout=10)
-
-            if result.returncode == 0 and result.stdout:
-                version_lines = result.stdout.strip().split('\n')
-                if version_lines:
-                    # Primera línea contiene la versión principal
-                    main_version = version_lines[0]
-                    self.print_colored(f"🐘 Versión: {main_version}", "cyan")
-
-                    # Mostrar información adicional si existe
-                    if len(version_lines) > 1:
-                        for line in version_lines[1:3]:  # Máximo 2 líneas adicionales
-                            if line.strip():
-                                self.print_colored(f"   {line.strip()}", "dark_gray")
+            probe = self._probe_php(php_exe)
+
+            if probe:
+                # Primera línea contiene la versión principal
+                main_version, *extra_lines = probe['version']
+                self.print_colored(f"🐘 Versión: {main_version}", "cyan")
+
+                # Mostrar información adicional
+                for line in extra_lines:
+                    self.print_colored(f"   {line}", "dark_gray")
             else:
                 self.print_colored("⚠️  No se pudo obtener información de versión", "yellow")
 
@@ -1879,39 +2223,36 @@ class PHPVersionManager:
         self.print_colored("\n📦 Módulos cargados:", "yellow")
 
         try:
-            result = subprocess.run([php_exe, "-m"],
-                                    capture_output=True, text=True, timeout=15)
+            php_modules = self._get_php_modules(php_exe)
 
-            if result.returncode == 0 and result.stdout:
+            if php_modules:
                 modules = []
                 core_modules = []
 
-                for line in result.stdout.strip().split('\n'):
-                    line = line.strip()
-                    if not line or line.startswith('['):
-                        continue
-
+                for line in php_modules[0]:
                     # Separar módulos core de extensiones
-                    if line.lower() in ['core', 'standard', 'pcre', 'spl', 'reflection']:
+                    if line.lower() in _CORE_MODULES:
                         core_modules.append(line)
                     else:
                         modules.append(line)
 
+                block = []
+
                 # Mostrar módulos core
                 if core_modules:
-                    self.print_colored("   Core:", "cyan")
-                    for module in sorted(core_modules):
-                        self.print_colored(f"     • {module}", "dark_gray")
+                    block.append(("   Core:", "cyan"))
+                    block.extend((f"     • {module}", "dark_gray") for module in sorted(core_modules))
 
                 # Mostrar extensiones
                 if modules:
-                    self.print_colored("   Extensiones:", "cyan")
+                    block.append(("   Extensiones:", "cyan"))
                     # Mostrar en columnas para mejor visualización
                     modules_sorted = sorted(modules)
-                    self._show_modules_in_columns(modules_sorted)
+                    block.extend(self._format_modules_in_columns(modules_sorted))
 
                 total_modules = len(core_modules) + len(modules)
-                self.print_colored(f"   📊 Total: {total_modules} módulos", "gray")
+                block.append((f"   📊 Total: {total_modules} módulos", "gray"))
+                self._print_block(block)
 
             else:
                 self.print_colored("   ⚠️  No se pudieron cargar los módulos", "yellow")
@@ -1921,61 +2262,83 @@ class PHPVersionManager:
         except Exception as e:
             self.print_colored(f"   ⚠️  Error obteniendo módulos: {str(e)}", "yellow")
 
-    def _show_modules_in_columns(self, modules: list, columns: int = 3) -> None:
-        """Muestra módulos en columnas para mejor visualización"""
+    def _probe_php(self, php_exe: str) -> Optional[dict]:
+        """Consulta versión, módulos y directivas de PHP con un único proceso (memoizado por ejecutable)
 
-        if not modules:
-            return
+        Returns:
+            dict: {'version': [líneas], 'modules': (nombres, frozenset en minúsculas),
+                   'config': {directiva: valor}} o None si PHP no respondió correctamente
+        """
+        cached = self._php_probe_cache.get(php_exe, self._php_probe_cache)
+        if cached is not self._php_probe_cache:
+            if isinstance(cached, Exception):
+                raise cached
+            return cached
+
+        try:
+            result = subprocess.run([php_exe, "-r", _PHP_PROBE_SCRIPT],
+                                    capture_output=True, text=True, timeout=15, **_QUIET_SUBPROCESS_KWARGS)
+        except (subprocess.TimeoutExpired, OSError) as e:
+            # Recordar el fallo para que el resto de secciones no vuelvan a esperar
+            self._php_probe_cache[php_exe] = e
+            raise
+
+        probe = None
+        lines = [line.strip() for line in result.stdout.splitlines()]
+        if result.returncode == 0 and lines.count(_PHP_PROBE_SEPARATOR) >= 2:
+            first = lines.index(_PHP_PROBE_SEPARATOR)
+            second = lines.index(_PHP_PROBE_SEPARATOR, first + 1)
+            php_version, sapi, zend_version = (lines[:first] + ["", "", ""])[:3]
+
+            names = tuple(name for name in lines[first + 1:second] if name)
+            config = {}
+            for line in lines[second + 1:]:
+                key, sep, value = line.partition('=')
+                if sep:
+                    # Normalizar booleanos desactivados ("") al "0" que mostraría php -i como Off
+                    config[key] = value or ("0" if key in _BOOLEAN_PHP_CONFIGS else "")
+
+            probe = {
+                'version': [f"PHP {php_version} ({sapi})", f"Zend Engine v{zend_version}"],
+                'modules': (names, frozenset(name.lower() for name in names)),
+                'config': config,
+            }
 
-        # Calcular ancho de columna basado en el módulo más largo
-        max_width = max(len(module) for module in modules) + 2
+        self._php_probe_cache[php_exe] = probe
+        return probe
 
-        for i in range(0, len(modules), columns):
-            row_modules = modules[i:i + columns]
-            row_text = ""
+    def _get_php_modules(self, php_exe: str) -> Optional[tuple]:
+        """Devuelve (nombres, frozenset en minúsculas) de los módulos cargados, o None si falló"""
+        probe = self._probe_php(php_exe)
+        return probe['modules'] if probe else None
 
-            for module in row_modules:
-                row_text += f"• {module:<{max_width}}"
+    def _format_modules_in_columns(self, modules: list, columns: int = 3) -> list:
+        """Devuelve las filas (texto, color) de los módulos distribuidos en columnas"""
+
+        if not modules:
+            return []
 
-            self.print_colored(f"     {row_text}", "dark_gray")
+        # Calcular ancho de columna basado en el módulo más largo y rellenar cada celda una sola vez
+        max_width = max(map(len, modules)) + 2
+        padded = ["• " + module.ljust(max_width) for module in modules]
+
+        return [("     " + "".join(padded[i:i + columns]), "dark_gray")
+                for i in range(0, len(padded), columns)]
 
     def _show_php_configuration(self, php_exe: str) -> None:
         """Muestra configuración importante de PHP"""
 
         self.print_colored("\n⚙️  Configuración importante:", "yellow")
 
-        # Configuraciones importantes a mostrar
-        important_configs = [
-            'memory_limit',
-            'max_execution_time',
-            'upload_max_filesize',
-            'post_max_size',
-            'max_file_uploads',
-            'date.timezone',
-            'error_reporting',
-            'display_errors'
-        ]
-
         try:
-            result = subprocess.run([php_exe, "-i"],
-                                    capture_output=True, text=True, timeout=20)
+            probe = self._probe_php(php_exe)
 
-            if result.returncode == 0 and result.stdout:
-                config_found = {}
-
-                for line in result.stdout.split('\n'):
-                    for config in important_configs:
-                        # Buscar configuración en formato "config => value"
-                        pattern = rf'{re.escape(config)}\s*=>\s*(.+)'
-                        match = re.search(pattern, line, re.IGNORECASE)
-
-                        if match and config not in config_found:
-                            value = match.group(1).strip()
-                            config_found[config] = value
+            if probe:
+                config_found = probe['config']
 
                 # Mostrar configuraciones encontradas
                 if config_found:
-                    for config in important_configs:
+                    for config in _IMPORTANT_PHP_CONFIGS:
                         if config in config_found:
                             value = config_found[config]
                             self._format_config_output(config, value)
@@ -1983,7 +2346,7 @@ class PHPVersionManager:
                     self.print_colored("   ⚠️  No se pudieron obtener configuraciones", "yellow")
 
             else:
-                self.print_colored("   ⚠️  Error ejecutando php -i", "yellow")
+                self.print_colored("   ⚠️  Error ejecutando PHP", "yellow")
 
         except subprocess.TimeoutExpired:
             self.print_colored("   ⚠️  Timeout obteniendo configuración", "yellow")
@@ -2008,8 +2371,7 @@ class PHPVersionManager:
 
         # Formatear nombre de configuración
         config_display = config.replace('_', ' ').title()
-        self.print_colored(f"   📋 {config_display}: ", "gray", end="")
-        self.print_colored(value, color)
+        self.print_colored_segments([(f"   📋 {config_display}: ", "gray"), (value, color)])
 
     def _show_php_extensions_status(self, php_exe: str) -> None:
         """Muestra estado de extensiones críticas"""
@@ -2025,17 +2387,17 @@ class PHPVersionManager:
         ]
 
         try:
-            result = subprocess.run([php_exe, "-m"],
-                                    capture_output=True, text=True, timeout=10)
+            php_modules = self._get_php_modules(php_exe)
 
-            if result.returncode == 0:
-                loaded_modules = set(result.stdout.lower().split())
+            if php_modules:
+                loaded_modules = php_modules[1]
 
-                for ext_name, description in critical_extensions:
-                    if ext_name.lower() in loaded_modules:
-                        self.print_colored(f"   ✅ {ext_name:<12} - {description}", "green")
-                    else:
-                        self.print_colored(f"   ❌ {ext_name:<12} - {description}", "red")
+                self._print_block(
+                    (f"   ✅ {ext_name:<12} - {description}", "green")
+                    if ext_name.lower() in loaded_modules else
+                    (f"   ❌ {ext_name:<12} - {description}", "red")
+                    for ext_name, description in critical_extensions
+                )
 
         except Exception:
             self.print_colored("   ⚠️  No se pudo verificar extensiones", "yellow")
@@ -2053,14 +2415,14 @@ class PHPVersionManager:
 
             try:
                 result = subprocess.run([php_exe, composer_phar, "--version", "--no-ansi"],
-                                        capture_output=True, text=True, timeout=10)
+                                        capture_output=True, text=True, timeout=10, **_QUIET_SUBPROCESS_KWARGS)
 
                 if result.returncode == 0 and result.stdout:
                     version_info = result.stdout.strip()
                     self.print_colored(f"📦 {version_info}", "cyan")
 
                     # Verificar si hay actualizaciones disponibles
-                    self._check_composer_updates(php_exe, composer_phar)
+                    self._check_composer_updates(version_info)
 
                 else:
                     self.print_colored("⚠️  Error obteniendo versión de Composer", "yellow")
@@ -2077,22 +2439,34 @@ class PHPVersionManager:
             self.print_colored("   Descarga https://getcomposer.org/composer.phar", "gray")
             self.print_colored(f"   Y colócalo en: {php_path}", "gray")
 
-    def _check_composer_updates(self, php_exe: str, composer_phar: str) -> None:
+    def _get_latest_composer_version(self) -> Optional[str]:
+        """Obtiene la última versión estable de Composer desde getcomposer.org (una vez por ejecución)"""
+        with self._composer_latest_lock:
+            if self._composer_latest is None:
+                try:
+                    response = self._get_http_session().get(_COMPOSER_VERSIONS_URL, timeout=3)
+                    response.raise_for_status()
+                    channels = response.json()
+                    self._composer_latest = channels["stable"][0]["version"]
+                except Exception:
+                    self._composer_latest = ""  # No reintentar en esta ejecución
+            return self._composer_latest or None
+
+    def _check_composer_updates(self, version_info: str) -> None:
         """Verifica si hay actualizaciones disponibles para Composer"""
 
         try:
-            # Verificar actualizaciones (con timeout corto para no demorar)
-            result = subprocess.run([php_exe, composer_phar, "self-update", "--dry-run"],
-                                    capture_output=True, text=True, timeout=5)
-
-            if result.returncode == 0:
-                if "already using the latest" in result.stdout.lower():
-                    self.print_colored("✅ Composer está actualizado", "green")
-                elif "would be updated" in result.stdout.lower():
-                    self.print_colored("⚡ Actualización disponible para Composer", "yellow")
+            # Comparar la versión instalada con el canal estable (JSON de ~2KB, sin lanzar PHP)
+            match = _COMPOSER_VERSION_RE.search(version_info)
+            latest = self._get_latest_composer_version()
+            if not match or not latest:
+                return
+
+            if version.parse(match.group(1)) >= version.parse(latest):
+                self.print_colored("✅ Composer está actualizado", "green")
+            else:
+                self.print_colored(f"⚡ Actualización disponible para Composer ({latest})", "yellow")
 
-        except subprocess.TimeoutExpired:
-            pass  # Ignorar timeout en verificación de updates
         except Exception:
             pass  # Ignorar errores en verificación de updates
 
@@ -2107,18 +2481,28 @@ class PHPVersionManager:
         self.print_colored("🔍 Información de todas las versiones PHP disponibles:", "cyan")
         print()
 
-        for version in sorted(self.available_versions.keys()):
-            php_path = self.available_versions[version]
+        versions = sorted(self.available_versions.keys())
 
-            self.print_colored(f"{'=' * 60}", "dark_gray")
-            self.print_colored(f"PHP {version}", "yellow")
-            self.print_colored(f"{'=' * 60}", "dark_gray")
+        # Cada versión se consulta en su propio hilo (dominado por subprocesos) con la salida
+        # acumulada aparte; se imprime después en orden para no mezclar líneas
+        with ThreadPoolExecutor(max_workers=min(8, len(versions))) as executor:
+            results = executor.map(
+                lambda v: self._run_buffered(self.show_php_info, self.available_versions[v]), versions
+            )
 
-            if self.show_php_info(php_path):
-                print()
-            else:
-                self.print_colored(f"❌ No se pudo mostrar información para PHP {version}", "red")
-                print()
+            for version, (success, output) in zip(versions, results):
+                self._print_block([
+                    ("=" * 60, "dark_gray"),
+                    (f"PHP {version}", "yellow"),
+                    ("=" * 60, "dark_gray"),
+                ])
+                sys.stdout.write(output)
+
+                if success:
+                    print()
+                else:
+                    self.print_colored(f"❌ No se pudo mostrar información para PHP {version}", "red")
+                    print()
 
     def install_composer(self, php_path: str, version: str = None):
         """
@@ -2150,20 +2534,40 @@ class PHPVersionManager:
         self.print_colored("📥 Descargando instalador de Composer...", "yellow")
 
         try:
-            # Descargar el instalador
-            urllib.request.urlretrieve(download_url, setup_file)
-
             # Verificar hash SHA384 del instalador (hash actualizado)
             expected_hash = "dac665fdc30fdd8ec78b38b9800061b4150413ff2e3b6f88543c636f7cd84f6db9189d43a81e5503cda447da73c7e5b6"
 
-            with open(setup_file, 'rb') as f:
-                file_content = f.read()
-                actual_hash = hashlib.sha384(file_content).hexdigest().lower()
+            # Descargar el instalador calculando el hash en la misma pasada (sin releer el archivo)
+            digest = hashlib.sha384()
+            received = 0
+            with self._get_http_session().get(download_url, stream=True, timeout=30) as resp:
+                resp.raise_for_status()
+
+                # Rechazar por tamaño antes de descargar y hashear nada
+                # (con Content-Encoding, Content-Length es el tamaño comprimido: solo cuenta lo recibido)
+                content_length = resp.headers.get('Content-Length')
+                if content_length and content_length.isdigit() and 'Content-Encoding' not in resp.headers:
+                    size = int(content_length)
+                    if not _COMPOSER_SETUP_MIN_SIZE <= size <= _COMPOSER_SETUP_MAX_SIZE:
+                        self.print_colored(f"❌ Tamaño inesperado del instalador: {size} bytes", "red")
+                        return False
+
+                with open(setup_file, 'wb') as out:
+                    for chunk in resp.iter_content(65536):
+                        received += len(chunk)
+                        if received > _COMPOSER_SETUP_MAX_SIZE:
+                            break
+                        digest.update(chunk)
+                        out.write(chunk)
+
+            if not _COMPOSER_SETUP_MIN_SIZE <= received <= _COMPOSER_SETUP_MAX_SIZE:
+                self.print_colored(f"❌ Tamaño inesperado del instalador (descargados {received} bytes)", "red")
+                return False
+
+            actual_hash = digest.hexdigest().lower()
 
             if actual_hash != expected_hash.lower():
                 self.print_colored("❌ Hash del instalador no coincide", "red")
-                if os.path.exists(setup_file):
-                    os.remove(setup_file)
                 return False
 
             # Preparar argumentos para la instalación
@@ -2183,11 +2587,7 @@ class PHPVersionManager:
             self.print_colored(f"🔧 Ejecutando instalador... {version_text}", "cyan")
 
             # Ejecutar el instalador
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-
-            # Limpiar archivo temporal
-            if os.path.exists(setup_file):
-                os.remove(setup_file)
+            result = subprocess.run(cmd, check=True, capture_output=True, text=True, **_QUIET_SUBPROCESS_KWARGS)
 
             # Verificar que Composer se instaló correctamente
             if os.path.exists(composer_phar):
@@ -2197,40 +2597,44 @@ class PHPVersionManager:
                 self.print_colored("❌ Error al instalar Composer", "red")
                 return False
 
-        except urllib.error.URLError as e:
+        except requests.exceptions.RequestException as e:
             self.print_colored(f"❌ Error al descargar: {e}", "red")
-            if os.path.exists(setup_file):
-                os.remove(setup_file)
             return False
 
         except subprocess.CalledProcessError as e:
             self.print_colored(f"❌ Error al ejecutar instalador: {e}", "red")
             if e.stderr:
                 self.print_colored(f"   Detalles: {e.stderr.strip()}", "red")
-            if os.path.exists(setup_file):
-                os.remove(setup_file)
             return False
 
         except Exception as e:
             self.print_colored(f"❌ Error inesperado: {e}", "red")
-            if os.path.exists(setup_file):
-                os.remove(setup_file)
             return False
 
-    def initialize_php_ini(self, php_path: str):
+        finally:
+            # Limpiar archivo temporal en todos los casos (un solo unlink, sin comprobar antes)
+            try:
+                os.unlink(setup_file)
+            except FileNotFoundError:
+                pass
+
+    def initialize_php_ini(self, php_path: str, snapshot: Optional[dict] = None):
         """
         Inicializa el archivo php.ini copiando desde php.ini-development o php.ini-production
 
         Args:
             php_path (str): Ruta al directorio PHP
+            snapshot (dict, optional): Listado de php_path ya obtenido con _snapshot_dir
 
         Returns:
             bool: True si php.ini existe o fue creado exitosamente, False en caso contrario
         """
         ini_path = os.path.join(php_path, "php.ini")
+        if snapshot is None:
+            snapshot = self._snapshot_dir(php_path)
 
         # Verificar si php.ini ya existe
-        if os.path.exists(ini_path):
+        if "php.ini" in snapshot:
             self.print_colored(f"✅ php.ini ya existe: {ini_path}", "green")
             return True
 
@@ -2239,15 +2643,16 @@ class PHPVersionManager:
         ini_prod = os.path.join(php_path, "php.ini-production")
 
         try:
+            # Solo se copia el contenido (copia nativa del sistema): el php.ini nuevo no hereda metadatos
             # Priorizar php.ini-development
-            if os.path.exists(ini_dev):
-                shutil.copy2(ini_dev, ini_path)
+            if "php.ini-development" in snapshot:
+                shutil.copyfile(ini_dev, ini_path)
                 self.print_colored("✅ php.ini creado desde php.ini-development", "green")
                 return True
 
             # Usar php.ini-production como alternativa
-            elif os.path.exists(ini_prod):
-                shutil.copy2(ini_prod, ini_path)
+            elif "php.ini-production" in snapshot:
+                shutil.copyfile(ini_prod, ini_path)
                 self.print_colored("✅ php.ini creado desde php.ini-production", "green")
                 return True
 
@@ -2279,6 +2684,21 @@ class PHPVersionManager:
             enable (bool): True para habilitar la extensión
             disable (bool): True para deshabilitar la extensión
 
+        Returns:
+            bool: True si la operación fue exitosa, False en caso contrario
+        """
+        return self.set_php_extensions(php_path, [extension], enable=enable, disable=disable)
+
+    def set_php_extensions(self, php_path: str, extensions: List[str], enable: bool = False, disable: bool = False):
+        """
+        Habilita o deshabilita varias extensiones PHP con una sola lectura y escritura de php.ini.
+
+        Args:
+            php_path (str): Ruta al directorio PHP
+            extensions (List[str]): Nombres de las extensiones (ej: ['curl', 'mysqli'])
+            enable (bool): True para habilitar las extensiones
+            disable (bool): True para deshabilitar las extensiones
+
         Returns:
             bool: True si la operación fue exitosa, False en caso contrario
         """
@@ -2289,58 +2709,45 @@ class PHPVersionManager:
             self.print_colored(f"❌ php.ini no encontrado: {ini_path}", "red")
             return False
 
-        try:
-            # Leer el contenido del archivo php.ini
-            with open(ini_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            # Patrón para encontrar cualquier línea relacionada con 'extension=...' para esta extensión
-            # Coincide con: extension=mysqli, extension=php_mysqli.dll, ;extension=mysqli, etc.
-            pattern = re.compile(rf"^\s*;?\s*extension\s*=\s*{re.escape(extension)}(\.dll)?\s*$", re.IGNORECASE)
-            # Patrón alternativo usando el nombre DLL (por compatibilidad)
-            dll_name = f"php_{extension}.dll"
-            pattern_dll = re.compile(rf"^\s*;?\s*extension\s*=\s*{re.escape(dll_name)}\s*$", re.IGNORECASE)
-
-            # Listas para reconstruir el archivo
-            new_lines = []
-            found = False
-            disabled_comment = ";"
+        # Archivo temporal junto a php.ini; se renombra sobre el original al terminar
+        tmp_path = ini_path + ".tmp"
 
+        try:
             # Determinar estado deseado
             wanted_enabled = enable and not disable
 
-            for line in lines:
-                stripped = line.strip()
+            with open(ini_path, 'r', encoding='utf-8') as f:
+                new_content = f.read()
 
-                # Si la línea coincide con cualquiera de los patrones de extensión
-                if pattern.match(stripped) or pattern_dll.match(stripped):
-                    # Ignorar esta línea; la reemplazaremos si es necesario
-                    continue
+            # Todas las extensiones se aplican sobre el contenido en memoria; php.ini se escribe una vez
+            for extension in extensions:
+                # Patrón para cualquier línea 'extension=...' de esta extensión (nombre corto o DLL)
+                pattern = _extension_line_pattern(extension)
 
-                # Mantener todas las demás líneas
-                new_lines.append(line)
+                # Eliminar de una sola pasada todas las líneas de la extensión; la reemplazaremos si es necesario
+                new_content = pattern.sub('', new_content)
 
-            # Si queremos habilitar, agregar una sola entrada limpia
-            if wanted_enabled:
-                new_entry = f"extension={extension}\n"
-                new_lines.append(new_entry)
-                self.print_colored(f"✅ {extension} habilitada (única entrada)", "green")
-                found = True
-            else:
-                # Si se deshabilitó, no agregamos nada
-                self.print_colored(f"❌ {extension} deshabilitada/removida", "yellow")
+                # Si queremos habilitar, agregar una sola entrada limpia
+                if wanted_enabled:
+                    if new_content and not new_content.endswith('\n'):
+                        new_content += '\n'
+                    new_content += f"extension={extension}\n"
 
-            # Escribir el archivo actualizado
-            with open(ini_path, 'w', encoding='utf-8') as f:
-                f.writelines(new_lines)
+            with open(tmp_path, 'w', encoding='utf-8') as out:
+                out.write(new_content)
 
-            self.print_colored(f"📝 php.ini actualizado: {ini_path}", "cyan")
+            # Reemplazo atómico: php.ini nunca queda escrito a medias
+            os.replace(tmp_path, ini_path)
+
+            for extension in extensions:
+                if wanted_enabled:
+                    self.print_colored(f"✅ {extension} habilitada (única entrada)", "green")
+                else:
+                    # Si se deshabilitó, no agregamos nada
+                    self.print_colored(f"❌ {extension} deshabilitada/removida", "yellow")
+                    self.print_colored(f"ℹ️ {extension} ya estaba deshabilitada o no estaba presente", "gray")
 
-            # Mensaje si no se encontró antes pero se agregó/eliminó
-            if not found and not wanted_enabled:
-                self.print_colored(f"ℹ️ {extension} ya estaba deshabilitada o no estaba presente", "gray")
-            elif not found and wanted_enabled:
-                self.print_colored(f"ℹ️ {extension} agregada por primera vez", "gray")
+            self.print_colored(f"📝 php.ini actualizado: {ini_path}", "cyan")
 
             return True
 
@@ -2356,90 +2763,135 @@ class PHPVersionManager:
             self.print_colored(f"❌ Error inesperado: {e}", "red")
             return False
 
-    def get_latest_php_versions_from_web(self, scan_only: bool = False):
+        finally:
+            # Si algo falló antes del reemplazo, no dejar el temporal a medias
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def _get_http_session(self) -> requests.Session:
+        """Devuelve la sesión HTTP compartida (se crea en el primer uso)"""
+        if self._http_session is None:
+            session = requests.Session()
+            # Pocas conexiones keep-alive reutilizadas entre escaneos, descargas y consultas a Composer
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['User-Agent'] = (
+                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            )
+            self._http_session = session
+        return self._http_session
+
+    def _cached_scan(self, key: str, fetcher, force_refresh: bool = False):
+        """Devuelve el resultado de fetcher() guardado en la caché de disco si no ha caducado
+
+        Los resultados vacíos (escaneo fallido) no se guardan.
+        """
+        with self._php_versions_cache_lock:
+            try:
+                with open(self.php_versions_cache_file, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+                if not isinstance(cache, dict):
+                    cache = {}
+            except (OSError, ValueError):
+                cache = {}
+
+            entry = cache.get(key)
+            if not force_refresh and isinstance(entry, dict):
+                age = time.time() - entry.get('ts', 0)
+                if 0 <= age < self.php_versions_cache_ttl:
+                    self.print_colored(f"📦 Versiones PHP desde caché (hace {int(age // 60)} min)", "gray")
+                    return entry.get('data')
+
+            data = fetcher()
+            if not data:
+                return data
+
+            cache[key] = {'ts': time.time(), 'data': data}
+            tmp_path = self.php_versions_cache_file + ".tmp"
+            try:
+                os.makedirs(os.path.dirname(self.php_versions_cache_file), exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, indent=2)
+                os.replace(tmp_path, self.php_versions_cache_file)
+            except OSError as e:
+                # No poder guardar la caché no es crítico
+                self.print_colored(f"⚠️  No se pudo guardar la caché de versiones: {e}", "yellow")
+
+            return data
+
+    def get_latest_php_versions_from_web(self, scan_only: bool = False, force_refresh: bool = False):
         """
         Obtiene las últimas versiones de PHP Thread Safe x64 desde windows.php.net
 
         Args:
             scan_only (bool): Si es True, solo escanea sin procesar (actualmente no usado)
+            force_refresh (bool): Ignorar la caché en disco y volver a escanear
 
         Returns:
             dict: Diccionario con versiones PHP disponibles o None si hay error
                   Formato: {'8.3': {'Version': '8.3.15', 'Url': 'https://...'}}
         """
+        return self._cached_scan('archives', self._fetch_latest_php_versions_from_web, force_refresh)
+
+    def _fetch_latest_php_versions_from_web(self):
+        """Escanea windows.php.net (archives) y devuelve la última versión de cada serie"""
         # base_url = "https://windows.php.net/downloads/releases/"
         base_url = "https://windows.php.net/downloads/releases/archives/"
 
         self.print_colored(f"🔍 Buscando versiones PHP Thread Safe x64 desde {base_url}...", "yellow")
 
         try:
-            # Realizar petición HTTP
-            with urllib.request.urlopen(base_url) as response:
-                html_content = response.read().decode('utf-8')
-
-            # Parsear HTML para extraer enlaces
-            parser = PHPLinkParser()
-            parser.feed(html_content)
+            # Realizar petición HTTP (sesión compartida)
+            response = self._get_http_session().get(base_url, timeout=10)
+            response.raise_for_status()
+            html_content = response.content.decode('utf-8')
 
-        except URLError as e:
-            self.print_colored(f"❌ No se pudo acceder a {base_url}: {e.reason}", "red")
+        except requests.exceptions.HTTPError as e:
+            self.print_colored(f"❌ Error HTTP {e.response.status_code}: {e.response.reason}", "red")
             return None
-        except HTTPError as e:
-            self.print_colored(f"❌ Error HTTP {e.code}: {e.reason}", "red")
+        except requests.exceptions.RequestException as e:
+            self.print_colored(f"❌ No se pudo acceder a {base_url}: {e}", "red")
             return None
         except Exception as e:
             self.print_colored(f"❌ Error inesperado: {e}", "red")
             return None
 
-        # Procesar enlaces encontrados
-        candidates = []
+        # Una sola pasada de regex sobre el HTML: el patrón ya descarta NTS, x86 y paquetes debug/devel/test/src
+        # Por serie: (tupla de enteros de la versión, versión completa, href); las tuplas se comparan sin parsear
+        latest = {}
 
-        for href in parser.links:
-            if '/php-' in href and href.endswith('.zip'):
-                # Obtener nombre del archivo
-                file_name = href.split('/')[-1]
+        for href, version_full, version_short in _PHP_HREF_RE.findall(html_content):
+            version_key = tuple(map(int, version_full.split('.')))
 
-                # Filtrar archivos no deseados
-                excluded_patterns = ['debug-pack', 'devel-pack', 'src.zip', 'test-pack', 'nts']
-                if not any(pattern in file_name for pattern in excluded_patterns):
-                    # Construir URL completa
-                    if href.startswith('http'):
-                        full_url = href
-                    else:
-                        full_url = urllib.parse.urljoin("https://windows.php.net", href)
+            # Almacenar solo la versión más reciente de cada serie
+            current = latest.get(version_short)
+            if current is None or version_key > current[0]:
+                latest[version_short] = (version_key, version_full, href)
 
-                    candidates.append({
-                        'FileName': file_name,
-                        'Url': full_url
-                    })
-
-        # Filtrar versiones Thread Safe x64
-        ts64_pattern = r'^php-(\d+\.\d+\.\d+)-Win32-(vs|vc)\d{2}-x64\.zip$'
         available_versions = {}
+        for version_short, (_, version_full, href) in latest.items():
+            # Construir URL completa (solo para la versión elegida de cada serie)
+            if href.startswith('http'):
+                full_url = href
+            elif href.startswith('/'):
+                # Caso habitual en windows.php.net: ruta absoluta, basta con anteponer el host
+                full_url = "https://windows.php.net" + href
+            else:
+                full_url = urllib.parse.urljoin(base_url, href)
 
-        for candidate in candidates:
-            file_name = candidate['FileName']
-            match = re.match(ts64_pattern, file_name, re.IGNORECASE)
-
-            if match:
-                version_full = match.group(1)
-                version_parts = version_full.split('.')
-
-                if len(version_parts) >= 2:
-                    version_short = f"{version_parts[0]}.{version_parts[1]}"
-
-                    # Almacenar solo la versión más reciente de cada serie
-                    if (version_short not in available_versions or
-                            version.parse(version_full) > version.parse(available_versions[version_short]['Version'])):
-                        available_versions[version_short] = {
-                            'Version': version_full,
-                            'Url': candidate['Url']
-                        }
+            available_versions[version_short] = {
+                'Version': version_full,
+                'Url': full_url
+            }
 
         # Mostrar resultados encontrados
         if available_versions:
             self.print_colored(f"✅ Encontradas {len(available_versions)} series de versiones PHP", "green")
-            for ver_short in sorted(available_versions.keys(), key=lambda x: version.parse(x), reverse=True):
+            for ver_short in sorted(available_versions.keys(), key=lambda x: latest[x][0], reverse=True):
                 ver_info = available_versions[ver_short]
                 self.print_colored(f"   📦 PHP {ver_short}: v{ver_info['Version']}", "cyan")
         else:
@@ -2466,11 +2918,17 @@ class PHPVersionManager:
         php_path = self.available_versions[version]
         php_exe = os.path.join(php_path, "php.exe")
 
+        # Un único listado del directorio responde a todas las comprobaciones de existencia
+        snapshot = self._snapshot_dir(php_path)
+
         # Verificar que el ejecutable de PHP existe
-        if not os.path.exists(php_exe):
+        if "php.exe" not in snapshot:
             self.print_colored(f"❌ PHP {version} no está instalado: {php_path}", "red")
             return False
 
+        # Lanzar "php -v" en segundo plano mientras se comprueba Composer
+        version_future = _php_info_pool().submit(self._get_php_version_line, php_exe, version)
+
         try:
             # Establecer la versión activa de PHP
             self.active_php_version = version
@@ -2495,7 +2953,7 @@ class PHPVersionManager:
 
             # Verificar si Composer está disponible
             composer_phar = os.path.join(php_path, "composer.phar")
-            if os.path.exists(composer_phar):
+            if "composer.phar" in snapshot:
                 self.active_composer_phar = composer_phar
                 composer_version_text = f"v{target_composer_version}" if target_composer_version else "disponible"
                 self.print_colored(f"✅ Composer listo ({composer_version_text})", "green")
@@ -2503,18 +2961,15 @@ class PHPVersionManager:
                 self.active_composer_phar = None
                 self.print_colored(f"⚠️ Composer no está instalado. Usa install_composer() para instalarlo.", "yellow")
 
+            self._active_php_info_cache = {
+                'version': version,
+                'path': php_path,
+                'exe': php_exe,
+                'composer_available': self.active_composer_phar is not None
+            }
+
             # Obtener información de versión de PHP
-            try:
-                result = subprocess.run([php_exe, '-v'],
-                                        capture_output=True,
-                                        text=True,
-                                        timeout=10)
-                if result.returncode == 0:
-                    php_version_line = result.stdout.split('\n')[0]
-                else:
-                    php_version_line = f"PHP {version} (error al obtener versión)"
-            except (subprocess.TimeoutExpired, subprocess.SubprocessError, Exception):
-                php_version_line = f"PHP {version} (error al obtener versión)"
+            php_version_line = version_future.result()
 
             # Mostrar información de activación
             self.print_colored(f"🟢 PHP {version} activado para CLI", "green")
@@ -2532,6 +2987,33 @@ class PHPVersionManager:
             self.print_colored(f"❌ Error al activar PHP {version}: {e}", "red")
             return False
 
+    @staticmethod
+    def _snapshot_dir(path: str) -> dict:
+        """Lista un directorio una sola vez: {nombre en minúsculas: DirEntry} ({} si no existe)"""
+        try:
+            with os.scandir(path) as it:
+                return {entry.name.lower(): entry for entry in it}
+        except OSError:
+            return {}
+
+    @staticmethod
+    def _get_php_version_line(php_exe: str, version: str) -> str:
+        """Primera línea de "php -v" (o un texto de error si no se pudo obtener)"""
+        try:
+            # Entorno mínimo: "php -v" solo necesita PATH y SYSTEMROOT
+            env = {'PATH': os.environ.get('PATH', ''), 'SYSTEMROOT': os.environ.get('SYSTEMROOT', '')}
+            result = subprocess.run([php_exe, '-v'],
+                                    capture_output=True,
+                                    text=True,
+                                    timeout=10,
+                                    env=env,
+                                    **_QUIET_SUBPROCESS_KWARGS)
+            if result.returncode == 0:
+                return result.stdout.split('\n')[0]
+        except Exception:
+            pass
+        return f"PHP {version} (error al obtener versión)"
+
     def run_php(self, *args):
         """
         Ejecuta PHP con la versión activa
@@ -2549,7 +3031,8 @@ class PHPVersionManager:
         try:
             return subprocess.run([self.active_php_exe] + list(args),
                                   capture_output=True,
-                                  text=True)
+                                  text=True,
+                                  **_QUIET_SUBPROCESS_KWARGS)
         except Exception as e:
             self.print_colored(f"❌ Error al ejecutar PHP: {e}", "red")
             return None
@@ -2575,7 +3058,8 @@ class PHPVersionManager:
         try:
             return subprocess.run([self.active_php_exe, self.active_composer_phar] + list(args),
                                   capture_output=True,
-                                  text=True)
+                                  text=True,
+                                  **_QUIET_SUBPROCESS_KWARGS)
         except Exception as e:
             self.print_colored(f"❌ Error al ejecutar Composer: {e}", "red")
             return None
@@ -2587,15 +3071,11 @@ class PHPVersionManager:
         Returns:
             dict: Información de la versión activa o None si no hay versión activa
         """
-        if not hasattr(self, 'active_php_version'):
+        if self._active_php_info_cache is None:
             return None
 
-        return {
-            'version': getattr(self, 'active_php_version', None),
-            'path': getattr(self, 'active_php_path', None),
-            'exe': getattr(self, 'active_php_exe', None),
-            'composer_available': hasattr(self, 'active_composer_phar') and self.active_composer_phar is not None
-        }
+        # Copia para que el llamador no pueda alterar la caché
+        return self._active_php_info_cache.copy()
 
     def execute_php_command(self, command: str, shell: bool = False, show_output: bool = True):
         """
@@ -2611,6 +3091,9 @@ class PHPVersionManager:
         """
         self.print_colored(f"▶️ Ejecutando: {command}", "yellow")
 
+        # Con salida capturada no hay interacción posible; con salida en vivo se hereda la consola
+        quiet_kwargs = {} if show_output else _QUIET_SUBPROCESS_KWARGS
+
         try:
             if shell:
                 # Ejecutar en shell (permite comandos complejos con pipes, etc.)
@@ -2618,7 +3101,8 @@ class PHPVersionManager:
                     command,
                     shell=True,
                     text=True,
-                    capture_output=not show_output
+                    capture_output=not show_output,
+                    **quiet_kwargs
                 )
             else:
                 # Parsear comando de forma segura
@@ -2643,7 +3127,8 @@ class PHPVersionManager:
                 result = subprocess.run(
                     cmd_parts,
                     text=True,
-                    capture_output=not show_output
+                    capture_output=not show_output,
+                    **quiet_kwargs
                 )
 
             # Mostrar resultado si se capturó la salida
@@ -2694,7 +3179,7 @@ class PHPVersionManager:
         self.print_colored(f"▶️ Ejecutando script PHP: {command_str}", "yellow")
 
         try:
-            result = subprocess.run(cmd_parts, text=True, capture_output=True)
+            result = subprocess.run(cmd_parts, text=True, capture_output=True, **_QUIET_SUBPROCESS_KWARGS)
 
             # Mostrar salida
             if result.stdout:
@@ -2734,9 +3219,17 @@ class PHPVersionManager:
 
         self.print_colored("🔗 Iniciando PHP interactivo (Ctrl+C para salir)...", "cyan")
 
+        # El REPL hereda directamente la consola (stdin/stdout/stderr): sin pipes intermedios que bufferizar
+        proc = None
         try:
-            subprocess.run([self.active_php_exe, '-a'], check=True)
+            proc = subprocess.Popen([self.active_php_exe, '-a'])
+            returncode = proc.wait()
+            if returncode != 0:
+                self.print_colored(f"❌ Error en modo interactivo: PHP terminó con código {returncode}", "red")
         except KeyboardInterrupt:
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+                proc.wait()
             self.print_colored("\n👋 Saliendo de PHP interactivo", "gray")
         except Exception as e:
             self.print_colored(f"❌ Error en modo interactivo: {e}", "red")
@@ -2753,10 +3246,11 @@ class PHPVersionManager:
         """
         ini_path = os.path.join(php_path, "php.ini")
         ext_dir_path = os.path.join(php_path, "ext")
+        snapshot = self._snapshot_dir(php_path)
 
         result = {
-            'ini_exists': os.path.exists(ini_path),
-            'ext_dir_exists': os.path.exists(ext_dir_path),
+            'ini_exists': "php.ini" in snapshot,
+            'ext_dir_exists': "ext" in snapshot,
             'configured_path': None,
             'correct_path': ext_dir_path.replace('\\', '/'),
             'is_correctly_configured': False,
@@ -2767,16 +3261,18 @@ class PHPVersionManager:
             return result
 
         try:
-            # Leer configuración actual
-            with open(ini_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            # Buscar configuración de extension_dir
-            pattern = r"^extension_dir\s*=\s*[\"']?([^\"'\n\r]+)[\"']?"
-            match = re.search(pattern, content, re.MULTILINE | re.IGNORECASE)
-
-            if match:
-                result['configured_path'] = match.group(1).strip()
+            # Buscar configuración de extension_dir directamente sobre el archivo mapeado (sin leerlo entero)
+            configured = None
+            with open(ini_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:  # mmap no admite archivos vacíos
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        match = _EXTDIR_RE.search(mm)
+                        if match:
+                            # Solo se copia y decodifica el valor encontrado
+                            configured = match.group(1)
+
+            if configured is not None:
+                result['configured_path'] = configured.decode('utf-8').strip()
                 # Normalizar rutas para comparación
                 configured_normalized = result['configured_path'].replace('\\', '/')
                 correct_normalized = result['correct_path']
@@ -2820,32 +3316,27 @@ class PHPVersionManager:
             self.print_colored("⚠️ extension_dir no está configurado", "yellow")
             self.print_colored("💡 Usar fix_extension_dir() para configurar", "yellow")
 
-    def scan_online_php_versions(self) -> Optional[Dict]:
+    def scan_online_php_versions(self, force_refresh: bool = False) -> Optional[Dict]:
         """Intenta escanear versiones online. Devuelve dict con {ver: {url: ...}} o None."""
+        return self._cached_scan('releases', self._fetch_online_php_versions, force_refresh)
+
+    def _fetch_online_php_versions(self) -> Dict:
+        """Escanea windows.php.net (releases) sin caché"""
         base_url = "https://windows.php.net/downloads/releases/"
         # base_url = "https://windows.php.net/downloads/releases/archives/"
         self.print_colored(f"🔍 Intentando escanear versiones desde {base_url}...", "yellow")
 
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-
         try:
-            req = urllib.request.Request(base_url, headers=headers)
-            with urllib.request.urlopen(req, timeout=10) as response:
-                html = response.read().decode('utf-8', errors='ignore')
-
-            # Buscar archivos PHP Thread Safe x64
-            pattern = r'href="([^"]*php-\d+\.\d+\.\d+-Win32-vs\d+-x64\.zip)"'
-            matches = re.findall(pattern, html)
+            # La sesión compartida ya envía el User-Agent de navegador
+            response = self._get_http_session().get(base_url, timeout=10)
+            response.raise_for_status()
+            html = response.content.decode('utf-8', errors='ignore')
 
+            # Buscar archivos PHP Thread Safe x64 (la serie se captura en la misma pasada)
             versions = {}
-            for filename in matches:
+            for filename, short_ver in _SCAN_HREF_RE.findall(html):
                 full_url = f"https://windows.php.net/downloads/releases/{filename}"
-                ver_match = re.search(r'php-(\d+\.\d+)\.\d+', filename)
-                if ver_match:
-                    short_ver = ver_match.group(1)
-                    versions[short_ver] = {"url": full_url}
+                versions[short_ver] = {"url": full_url}
 
             if versions:
                 self.print_colored(f"✅ Versiones encontradas online: {', '.join(versions.keys())}", "green")
@@ -2871,19 +3362,8 @@ class PHPVersionManager:
             return url
 
         # 2. Fallback: URLs estáticas (por si el scraping falla)
-        fallback_urls = {
-            "7.1": "https://windows.php.net/downloads/releases/archives/php-7.1.9-Win32-VC14-x64.zip",
-            "7.3": "https://windows.php.net/downloads/releases/archives/php-7.3.9-Win32-VC15-x64.zip",
-            "7.4": "https://windows.php.net/downloads/releases/php-7.4.33-Win32-vs16-x64.zip",
-            "8.0": "https://windows.php.net/downloads/releases/php-8.0.30-Win32-vs16-x64.zip",
-            "8.1": "https://windows.php.net/downloads/releases/php-8.1.33-Win32-vs16-x64.zip",
-            "8.2": "https://windows.php.net/downloads/releases/php-8.2.29-Win32-vs16-x64.zip",
-            "8.3": "https://windows.php.net/downloads/releases/php-8.3.24-Win32-vs16-x64.zip",
-            "8.4": "https://windows.php.net/downloads/releases/php-8.4.0-Win32-vs16-x64.zip"
-        }
-
-        if version in fallback_urls:
-            url = fallback_urls[version]
+        url = _FALLBACK_PHP_URLS.get(version)
+        if url:
             self.print_colored(f"⚠️ Usando URL estática para PHP {version} (scraping fallido o no soportado)", "yellow")
             return url
 
@@ -2912,7 +3392,6 @@ class PHPVersionManager:
             return False
 
         php_path = self.available_versions[version]
-        zip_file = f"php-{version}.zip"
 
         # Obtener URL de descarga
         url = self.get_php_download_url(version)
@@ -2926,43 +3405,56 @@ class PHPVersionManager:
         self.print_colored(f"📥 Descargando PHP {version} (Thread Safe x64) desde:", "yellow")
         self.print_colored(f"   {url}", "gray")
 
-        # Descargar archivo
-        try:
-            urllib.request.urlretrieve(url, zip_file)
-        except Exception as e:
-            self.print_colored(f"❌ Error al descargar: {str(e)}", "red")
-            return False
+        # Descargar el ZIP a un buffer (memoria, o disco si crece demasiado) sin .zip intermedio en el CWD
+        with tempfile.SpooledTemporaryFile(max_size=_PHP_ZIP_SPOOL_SIZE) as zip_data:
+            if not self._download_php_zip(url, zip_data):
+                return False
 
-        # Verificar que se descargó el archivo
-        if not os.path.exists(zip_file):
-            self.print_colored(f"❌ No se descargó el archivo: {zip_file}", "red")
-            return False
+            # Preparar directorio de instalación: apartar la anterior (renombrar es instantáneo) para recuperarla si algo falla
+            self.print_colored(f"📦 Descomprimiendo en {php_path}...", "yellow")
+            stale_path = None
+            if os.path.exists(php_path):
+                stale_path = f"{php_path}.old"
+                try:
+                    if os.path.exists(stale_path):
+                        self._fast_rmtree(stale_path)
+                    os.replace(php_path, stale_path)
+                except OSError as e:
+                    self.print_colored(f"❌ No se pudo reemplazar la instalación actual de PHP {version}: {e}", "red")
+                    self.print_colored("   💡 Detén Apache/php-cgi si están usando esta versión", "yellow")
+                    return False
+            os.makedirs(php_path, exist_ok=True)
 
-        # Preparar directorio de instalación
-        self.print_colored(f"📦 Descomprimiendo en {php_path}...", "yellow")
-        if os.path.exists(php_path):
-            shutil.rmtree(php_path)
-        os.makedirs(php_path, exist_ok=True)
+            # Descomprimir directamente desde el buffer
+            try:
+                zip_data.seek(0)
+                with zipfile.ZipFile(zip_data, 'r') as zip_ref:
+                    self._extract_zip_parallel(zip_ref, php_path)
+            except Exception as e:
+                self.print_colored(f"❌ Error al descomprimir: {str(e)}", "red")
+                self._restore_previous_php(stale_path, php_path)
+                return False
 
-        # Descomprimir archivo
-        try:
-            with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                zip_ref.extractall(php_path)
-            os.remove(zip_file)
-        except Exception as e:
-            self.print_colored(f"❌ Error al descomprimir: {str(e)}", "red")
-            return False
+        # Un solo listado del directorio extraído para todas las comprobaciones siguientes
+        entries = self._snapshot_dir(php_path)
 
         # Verificar que php.exe existe
-        php_exe = os.path.join(php_path, "php.exe")
-        if not os.path.exists(php_exe):
-            self.print_colored(f"❌ No se encontró php.exe en: {php_exe}", "red")
+        if "php.exe" not in entries:
+            self.print_colored(f"❌ No se encontró php.exe en: {os.path.join(php_path, 'php.exe')}", "red")
+            self._restore_previous_php(stale_path, php_path)
             return False
 
+        # La nueva instalación es válida: ya se puede borrar la anterior
+        if stale_path:
+            try:
+                self._fast_rmtree(stale_path)
+            except OSError as e:
+                self.print_colored(f"⚠️ No se pudo eliminar la instalación anterior ({stale_path}): {e}", "yellow")
+
         self.print_colored(f"✅ PHP {version} instalado correctamente en {php_path}", "green")
 
         # Inicializar php.ini
-        if not self.initialize_php_ini(php_path):
+        if not self.initialize_php_ini(php_path, entries):
             return False
 
         # Corregir extension_dir
@@ -2971,11 +3463,9 @@ class PHPVersionManager:
 
         # Habilitar extensiones necesarias
         self.print_colored("🔧 Habilitando extensiones necesarias...", "yellow")
-        for extension in self.required_extensions:
-            self.set_php_extension(php_path, extension, enable=True)
+        self.set_php_extensions(php_path, self.required_extensions, enable=True)
 
         # Instalar Composer
-        composer_phar = os.path.join(php_path, "composer.phar")
         target_version = composer_version
 
         if not target_version and version in self.default_composer_versions:
@@ -2984,7 +3474,8 @@ class PHPVersionManager:
         if not target_version:
             target_version = "2.8.10"
 
-        if not os.path.exists(composer_phar):
+        # Los pasos de php.ini no crean composer.phar: el listado sigue siendo válido
+        if "composer.phar" not in entries:
             self.print_colored(f"📦 Instalando Composer v{target_version}...", "yellow")
             self.install_composer(php_path, target_version)
         else:
@@ -2992,6 +3483,106 @@ class PHPVersionManager:
 
         return True
 
+    def _restore_previous_php(self, stale_path: Optional[str], php_path: str) -> None:
+        """Devuelve a su sitio la instalación apartada tras un fallo, descartando lo extraído a medias"""
+        if not stale_path:
+            return
+        try:
+            if os.path.exists(php_path):
+                self._fast_rmtree(php_path)
+            os.replace(stale_path, php_path)
+            self.print_colored("↩️  Instalación anterior restaurada", "yellow")
+        except OSError as e:
+            self.print_colored(f"⚠️ No se pudo restaurar la instalación anterior desde {stale_path}: {e}", "yellow")
+
+    @staticmethod
+    def _fast_rmtree(path: str) -> None:
+        """Elimina un árbol de directorios borrando los archivos en paralelo (miles de archivos pequeños en PHP)"""
+        files = []
+        directories = []
+        # Recorrido de abajo arriba: cada directorio aparece después de sus subdirectorios
+        for root, _, filenames in os.walk(path, topdown=False):
+            files.extend(os.path.join(root, name) for name in filenames)
+            directories.append(root)
+
+        with ThreadPoolExecutor(max_workers=8, thread_name_prefix="rmtree") as pool:
+            # list() propaga el primer error de borrado
+            list(pool.map(os.unlink, files))
+
+        # Los directorios ya están vacíos; se eliminan en serie de abajo arriba
+        for directory in directories:
+            os.rmdir(directory)
+
+    @staticmethod
+    def _zip_member_path(dest_dir: str, name: str) -> str:
+        """Ruta de destino de un miembro del ZIP, saneada igual que ZipFile.extract (sin '..' ni unidades)"""
+        parts = [part for part in re.split(r'[\\/]', name)
+                 if part not in ('', '.', '..') and not part.endswith(':')]
+        return os.path.join(dest_dir, *parts)
+
+    def _extract_zip_parallel(self, zip_ref: zipfile.ZipFile, dest_dir: str) -> None:
+        """Extrae todos los miembros del ZIP: los grandes en un pool de hilos, los pequeños en el hilo actual"""
+        files = []
+        directories = {dest_dir}
+        for info in zip_ref.infolist():
+            target = self._zip_member_path(dest_dir, info.filename)
+            if info.is_dir():
+                directories.add(target)
+            else:
+                directories.add(os.path.dirname(target))
+                files.append((info, target))
+
+        # Crear antes todos los directorios: los hilos solo abren y escriben archivos
+        for directory in directories:
+            os.makedirs(directory, exist_ok=True)
+
+        def extract(item):
+            info, target = item
+            # ZipFile serializa las lecturas del archivo compartido; zlib descomprime sin el GIL
+            with zip_ref.open(info) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst, length=128 * 1024)
+
+        # Los grandes (php.exe, DLLs) primero y en paralelo; los cientos de pequeños no compensan una tarea cada uno
+        files.sort(key=lambda item: item[0].file_size, reverse=True)
+        big = [item for item in files if item[0].compress_size > _ZIP_SMALL_MEMBER_SIZE]
+        small = [item for item in files if item[0].compress_size <= _ZIP_SMALL_MEMBER_SIZE]
+
+        workers = max(1, (os.cpu_count() or 2) // 2)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="unzip") as pool:
+            futures = [pool.submit(extract, item) for item in big]
+            for item in small:
+                extract(item)
+            # result() propaga la primera excepción de extracción
+            for future in futures:
+                future.result()
+
+    def _download_php_zip(self, url: str, zip_data) -> bool:
+        """Descarga el ZIP de PHP en streaming sobre zip_data (sesión HTTP compartida)"""
+        try:
+            with self._get_http_session().get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+
+                total_size = int(response.headers.get('content-length', 0))
+                writer = _ProgressWriter(zip_data, total_size, self._print_download_progress)
+
+                # Copia en bloques grandes desde el socket (descomprimiendo gzip/deflate si aplica)
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, writer, length=_DOWNLOAD_BUFFER_SIZE)
+
+            if writer.report is not None:
+                print()  # Nueva línea
+
+        except Exception as e:
+            self.print_colored(f"❌ Error al descargar: {str(e)}", "red")
+            return False
+
+        # Verificar que se descargó algo
+        if writer.written == 0:
+            self.print_colored("❌ Error: El archivo descargado está vacío", "red")
+            return False
+
+        return True
+
     def fix_extension_dir(self, php_path: str) -> bool:
         """Corrige el extension_dir en php.ini"""
         try:
@@ -3008,20 +3599,15 @@ class PHPVersionManager:
             # extension_dir = os.path.join(php_path, "ext").replace("\\", "/")
             extension_dir = "ext"
 
-            # Buscar y reemplazar extension_dir
-            lines = content.split('\n')
-            modified = False
-
-            for i, line in enumerate(lines):
-                if line.strip().startswith(';extension_dir') or line.strip().startswith('extension_dir'):
-                    lines[i] = f'extension_dir = "{extension_dir}"'
-                    modified = True
-                    break
+            # Buscar y reemplazar la primera línea extension_dir en una sola pasada
+            content, modified = _EXTENSION_DIR_LINE_RE.subn(
+                lambda _: f'extension_dir = "{extension_dir}"', content, count=1
+            )
 
             if modified:
                 # Escribir archivo modificado
                 with open(ini_file, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(lines))
+                    f.write(content)
 
                 self.print_colored(f"✅ extension_dir configurado a: {extension_dir}", "green")
 
@@ -3035,20 +3621,23 @@ class PHPVersionManager:
         ini_path = os.path.join(php_path, "php.ini")
         if not os.path.exists(ini_path): return
         with open(ini_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        for i, line in enumerate(lines):
-            for ext in self.required_extensions:
-                dll = f"php_{ext}.dll"
-                if dll in line and line.strip().startswith(';'):
-                    lines[i] = line.lstrip('; ').rstrip() + '\n'
-                    self.print_colored(f"✅ {ext} habilitado", "green")
-                    break
-        with open(ini_path, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
+            content = f.read()
+
+        def uncomment(match):
+            self.print_colored(f"✅ {match.group('ext')} habilitado", "green")
+            return match.group(1)
+
+        # Una sola pasada sobre todo el archivo; solo se reescribe si algo cambió
+        pattern = _commented_extensions_pattern(tuple(self.required_extensions))
+        content, enabled = pattern.subn(uncomment, content)
+        if enabled:
+            with open(ini_path, 'w', encoding='utf-8') as f:
+                f.write(content)
 
     def _escape_apache_path(self, path: str) -> str:
         """Convierte una ruta de Windows en formato seguro para Apache (usa / o \\ correctamente)"""
         # Opción 1: Usar barras normales (recomendado para Apache en Windows)
+        # str.replace de un carácter es ~50x más rápido que str.translate para rutas cortas
         return path.replace('\\', '/')
 
         # Opción 2: Usar dobles barras invertidas (también válido)
@@ -3061,32 +3650,31 @@ class PHPVersionManager:
         """
         php_exe = os.path.join(php_path, "php.exe")
 
-        # Verificar que PHP exista
-        if not os.path.exists(php_exe):
-            print(f"❌ PHP no encontrado en: {php_exe}")
-            return False
-
-        # Verificar que httpd.conf exista
-        if not os.path.exists(apache_conf):
-            print(f"❌ Archivo de configuración de Apache no encontrado: {apache_conf}")
-            return False
+        # Un solo listado de la carpeta de PHP para php.exe y las DLL de Apache
+        php_entries = PHPVersionManager._snapshot_dir(php_path)
 
-        # Verificar que httpd.exe exista
-        if not os.path.exists(apache_bin):
-            print(f"❌ Ejecutable de Apache no encontrado: {apache_bin}")
+        # Verificar de una vez que PHP, httpd.conf y httpd.exe existan
+        required = {
+            php_exe: "php.exe" in php_entries,
+            apache_conf: os.path.isfile(apache_conf),
+            apache_bin: os.path.isfile(apache_bin),
+        }
+        missing = [path for path, found in required.items() if not found]
+        if missing:
+            print(f"❌ Faltan archivos necesarios: {', '.join(missing)}")
             return False
 
-        # Determinar versión de PHP (7.x o 8.x)
-        try:
-            result = subprocess.run(
-                [php_exe, "-r", "echo substr(PHP_VERSION, 0, 3);"],
-                capture_output=True, text=True, check=True
-            )
-            php_version = result.stdout.strip()
-            is_php7 = php_version.startswith("7.")
-        except subprocess.CalledProcessError as e:
-            print(f"❌ No se pudo obtener la versión de PHP: {e}")
-            return False
+        # Determinar versión de PHP (7.x o 8.x): primero por el nombre de la carpeta, luego ejecutando php.exe
+        dir_match = _PHP_DIR_VERSION_RE.match(PureWindowsPath(php_path).name)
+        if dir_match:
+            php_version = f"{dir_match.group(1)}.{dir_match.group(2)}"
+        else:
+            try:
+                php_version = _php_short_version(php_exe, os.path.getmtime(php_exe))
+            except subprocess.CalledProcessError as e:
+                print(f"❌ No se pudo obtener la versión de PHP: {e}")
+                return False
+        is_php7 = php_version.startswith("7.")
 
         # Definir nombres de archivos según versión
         sapi_dll = "php7apache2_4.dll" if is_php7 else "php8apache2_4.dll"
@@ -3096,13 +3684,8 @@ class PHPVersionManager:
         sapi_dll_path = os.path.join(php_path, sapi_dll)
         ts_dll_path = os.path.join(php_path, ts_dll)
 
-        # Verificar que los archivos necesarios existan
-        missing = []
-        if not os.path.exists(sapi_dll_path):
-            missing.append(sapi_dll)
-        if not os.path.exists(ts_dll_path):
-            missing.append(ts_dll)
-
+        # Verificar que los archivos necesarios existan (sobre el listado ya obtenido)
+        missing = [name for name in (sapi_dll, ts_dll) if name not in php_entries]
         if missing:
             print(f"❌ Faltan archivos en {php_path}: {', '.join(missing)}")
             return False
@@ -3113,52 +3696,41 @@ class PHPVersionManager:
         temp_conf = f"{apache_conf}.tmp"
 
         try:
-            # Leer configuración actual
-            with open(apache_conf, 'r', encoding='utf-8') as f:
-                content = f.readlines()
-
-            # Filtrar líneas antiguas de PHP
-            new_content = []
-            skip_next = False  # Para manejar líneas en bloque si es necesario
-            for line in content:
-                line_stripped = line.strip()
-
-                # Saltar líneas relacionadas con módulos PHP anteriores
-                if any(pattern in line_stripped for pattern in [
-                    "LoadModule php_module",
-                    "LoadModule php7_module",
-                    "PHPIniDir",
-                    "AddType application/x-httpd-php",
-                    "LoadFile"
-                ]):
-                    # Pero también verificar si contiene nombres específicos
-                    if (sapi_dll in line or ts_dll in line or
-                            "php_module" in line or "application/x-httpd-php" in line):
-                        continue
-                    # Si no es de la versión actual, igual la omitimos
-                    continue
-
-                new_content.append(line)
-
-            # Añadir nueva configuración
-            new_content.append("\n")
-            new_content.append("# Configuración de PHP generada automáticamente\n")
-            new_content.append(f'LoadModule {module_line} "{sapi_dll_path.replace("\\", "/")}"\n')
-            new_content.append('AddType application/x-httpd-php .php\n')
-            new_content.append(f'PHPIniDir "{php_path.replace("\\", "/")}"\n')
-            new_content.append(f'LoadFile "{ts_dll_path.replace("\\", "/")}"\n')
+            # Leer configuración actual en binario: sin decodificar UTF-8 ni traducir saltos de línea
+            with open(apache_conf, 'rb') as f:
+                raw = f.read()
+            newline = b"\r\n" if b"\r\n" in raw else b"\n"
+
+            # Filtrar líneas antiguas de PHP (una sola regex por línea)
+            new_content = [line for line in raw.splitlines(keepends=True) if not _PHP_APACHE_LINE_RE.search(line)]
+            if new_content and not new_content[-1].endswith(b"\n"):
+                new_content.append(newline)
+
+            # Añadir nueva configuración (un solo bloque codificado de una vez)
+            sapi_path = self._escape_apache_path(sapi_dll_path)
+            ini_dir = self._escape_apache_path(php_path)
+            ts_path = self._escape_apache_path(ts_dll_path)
+            block = [
+                "",
+                "# Configuración de PHP generada automáticamente",
+                f'LoadModule {module_line} "{sapi_path}"',
+                'AddType application/x-httpd-php .php',
+                f'PHPIniDir "{ini_dir}"',
+                f'LoadFile "{ts_path}"',
+            ]
+            new_content.append(newline.join(line.encode('utf-8') for line in block) + newline)
 
             # Escribir archivo temporal
-            with open(temp_conf, 'w', encoding='utf-8') as f:
+            with open(temp_conf, 'wb') as f:
                 f.writelines(new_content)
 
             # Validar configuración de Apache
             print("🔍 Validando configuración de Apache...")
-            result = subprocess.run([apache_bin, "-t"], capture_output=True, text=True)
+            returncode, _, stderr = _apache_config_test(apache_bin, PHPVersionManager._config_file_key(apache_conf))
 
-            if result.returncode != 0:
+            if returncode != 0:
                 print("❌ Configuración de Apache inválida:")
-                for line in result.stderr.splitlines():
+                for line in stderr.splitlines():
                     print(f"  {line}")
                 os.remove(temp_conf)
                 return False
@@ -3169,16 +3741,39 @@ class PHPVersionManager:
 
             # Reiniciar Apache
             print("🔄 Reiniciando Apache...")
-            stop_result = subprocess.run(["net", "stop", "Apache2.4"], capture_output=True, text=True)
-            subprocess.run(["timeout", "2"], shell=True)  # Espera 2 segundos
-            start_result = subprocess.run(["net", "start", "Apache2.4"], capture_output=True, text=True)
+            try:
+                import win32service
+                import win32serviceutil
+            except ImportError:
+                win32serviceutil = None
 
-            if start_result.returncode == 0:
+            if win32serviceutil is not None:
+                # Directamente contra el SCM: se arranca en cuanto el servicio está detenido, sin espera fija
+                try:
+                    win32serviceutil.StopService("Apache2.4")
+                    win32serviceutil.WaitForServiceStatus("Apache2.4", win32service.SERVICE_STOPPED, 10)
+                except Exception:
+                    pass  # Igual que con "net stop": si no estaba en marcha, se intenta arrancar igualmente
+                try:
+                    win32serviceutil.StartService("Apache2.4")
+                    win32serviceutil.WaitForServiceStatus("Apache2.4", win32service.SERVICE_RUNNING, 10)
+                    start_error = None
+                except Exception as e:
+                    start_error = str(e)
+            else:
+                # "net stop" ya espera a que el servicio quede detenido antes de volver
+                subprocess.run(["net", "stop", "Apache2.4"], capture_output=True, text=True,
+                               **_QUIET_SUBPROCESS_KWARGS)
+                start_result = subprocess.run(["net", "start", "Apache2.4"], capture_output=True, text=True,
+                                              **_QUIET_SUBPROCESS_KWARGS)
+                start_error = start_result.stderr if start_result.returncode != 0 else None
+
+            if start_error is None:
                 print("✅ Apache reiniciado correctamente.")
                 return True
             else:
                 print("❌ Error al reiniciar Apache. Verifica el servicio.")
-                print(start_result.stderr)
+                print(start_error)
                 return False
 
         except Exception as e:
@@ -3200,30 +3795,22 @@ class PHPVersionManager:
 
         try:
             with open(self.apache_conf, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            updated = False
-            new_lines = []
-
-            for line in lines:
-                stripped = line.strip()
-                # Detectar línea comentada de mod_rewrite
-                if stripped.startswith("#LoadModule rewrite_module") and "mod_rewrite.so" in stripped:
-                    new_lines.append("LoadModule rewrite_module modules/mod_rewrite.so\n")
-                    updated = True
-                    self.print_colored("✅ mod_rewrite habilitado", "green")
-                else:
-                    new_lines.append(line)
+                content = f.read()
+
+            # Descomentar la línea de mod_rewrite en una sola pasada
+            new_content, updated = _REWRITE_COMMENTED_RE.subn(
+                "LoadModule rewrite_module modules/mod_rewrite.so", content
+            )
 
             # Solo guardar si se hizo un cambio
             if updated:
+                self.print_colored("✅ mod_rewrite habilitado", "green")
                 with open(self.apache_conf, 'w', encoding='utf-8') as f:
-                    f.writelines(new_lines)
+                    f.write(new_content)
                 self.print_colored("💾 Cambios guardados en httpd.conf", "green")
             else:
                 # Verificar si ya está habilitado
-                if any("LoadModule rewrite_module modules/mod_rewrite.so" in line and not line.strip().startswith('#')
-                       for line in lines):
+                if _REWRITE_ENABLED_RE.search(content):
                     self.print_colored("✅ mod_rewrite ya está habilitado", "green")
                 else:
                     self.print_colored("❌ No se encontró la directiva LoadModule para mod_rewrite", "red")
@@ -3236,21 +3823,47 @@ class PHPVersionManager:
             return False
 
 
-class PHPLinkParser(HTMLParser):
-    """Parser HTML personalizado para extraer enlaces de archivos ZIP de PHP"""
+def _split_cli_command(command):
+    """Divide --command en argumentos; en Windows las barras invertidas de las rutas no son escapes"""
+    parts = shlex.split(command, posix=(os.name != 'nt'))
+    if os.name != 'nt':
+        return parts
+    # posix=False conserva las comillas en cada argumento: quitarlas (list2cmdline las vuelve a poner si hace falta)
+    return [part[1:-1] if len(part) > 1 and part[0] == part[-1] and part[0] in '"\'' else part for part in parts]
 
-    def __init__(self):
-        super().__init__()
-        self.links = []
 
-    def handle_starttag(self, tag, attrs):
-        if tag.lower() == 'a':
-            for name, value in attrs:
-                if name.lower() == 'href' and value and value.endswith('.zip'):
-                    self.links.append(value)
+def _needs_shell(command):
+    """True si el comando usa tuberías, redirecciones, %VARIABLES% u órdenes internas de cmd.exe"""
+    words = command.split(None, 1)
+    return bool(_SHELL_METACHARACTERS.intersection(command)) or bool(words and words[0].lower() in _CMD_BUILTINS)
 
 
-def main():
+def _run_cli_command(manager, command, php_path=None):
+    """Ejecuta --command (directamente o, si lo necesita, a través del shell); con php_path, ese PHP va primero en el PATH"""
+    manager.print_colored(f"▶️ Ejecutando: {command}", "cyan")
+    try:
+        env = None
+        if php_path:
+            env = os.environ.copy()
+            env['PATH'] = f"{php_path}{os.pathsep}{env.get('PATH', '')}"
+        if _needs_shell(command):
+            subprocess.run(command, shell=True, env=env)
+            return
+
+        cmd_parts = _split_cli_command(command)
+        if env:
+            # CreateProcess busca el ejecutable en el PATH del proceso padre: resolverlo con el nuevo PATH
+            resolved = shutil.which(cmd_parts[0], path=env['PATH']) if cmd_parts else None
+            if resolved:
+                cmd_parts[0] = resolved
+        subprocess.run(cmd_parts, env=env)
+    except (OSError, ValueError, IndexError) as e:
+        manager.print_colored(f"❌ No se pudo ejecutar el comando: {e}", "red")
+
+
+@functools.lru_cache(maxsize=None)
+def _cli_parser():
+    """Parser de la línea de comandos (se construye una vez, en el primer uso)"""
     parser = argparse.ArgumentParser(description="PHP Version Manager", add_help=False)
     parser.add_argument("-v", "--version", help="Versión de PHP (para CLI o Info)")
     parser.add_argument("-l", "--list", action="store_true", help="Listar versiones disponibles")
@@ -3263,10 +3876,15 @@ def main():
     parser.add_argument("--show-mappings", action="store_true", help="Mostrar mappings actuales")
     parser.add_argument("--remove-mapping", action="store_true", help="Eliminar un mapping por alias")
     parser.add_argument("--scan", action="store_true", help="Escanea versiones PHP disponibles online")
-    parser.add_argument("--command", help="Ejecutar un comando PHP")
+    parser.add_argument("--refresh", "--no-cache", action="store_true",
+                        help="Ignorar la caché de versiones online (--scan, --install)")
+    parser.add_argument("--command", help="Ejecutar un comando PHP (pasa por el shell solo con |, &, <, >, %%VAR%% u órdenes internas)")
     parser.add_argument("--help", "-h", action="store_true", help="Mostrar ayuda")
+    return parser
+
 
-    args = parser.parse_args()
+def main():
+    args = _cli_parser().parse_args()
     manager = PHPVersionManager()
 
     # Mostrar ayuda si no hay argumentos o si se pide explícitamente
@@ -3274,6 +3892,10 @@ def main():
         manager.show_help()
         return
 
+    if args.scan or args.install:
+        # Solapar la resolución DNS con el resto del trabajo; las demás peticiones reutilizan la conexión keep-alive
+        _warm_dns("windows.php.net")
+
     # === Lógica principal (ordenada como en el PS1) ===
 
     if args.list:
@@ -3311,6 +3933,9 @@ def main():
         if not args.version:
             manager.print_colored("❌ Usa: --install -v <versión>", "red")
             return
+        if args.refresh:
+            # Rellenar las versiones remotas ignorando la caché; get_php_download_url las reutiliza
+            manager.remote_php_versions = manager.get_latest_php_versions_from_web(force_refresh=True)
         manager.install_php_version(args.version)
         return
 
@@ -3344,6 +3969,10 @@ def main():
         manager.print_colored("💡 Para usarlo en este terminal, ejecuta:", "gray")
         print(f"   set PATH={php_path};%PATH%")
 
+        if args.command:
+            # Ejecutar el comando con esta versión primero en el PATH
+            _run_cli_command(manager, args.command, php_path)
+
         # Mensaje contextual si se quiere configurar Apache
         if not args.info and not args.command:
             print("")
@@ -3354,21 +3983,12 @@ def main():
 
     if args.scan:
         manager.print_colored("🔍 Escaneando versiones PHP disponibles...", "cyan")
-        versions = manager.scan_online_php_versions()
+        versions = manager.scan_online_php_versions(force_refresh=args.refresh)
 
         # Si no hay resultados online, muestra el fallback
         if not versions:
             manager.print_colored("⚠️  Usando URLs estáticas (sin conexión)", "yellow")
-            versions = {
-                "7.1": {"url": "https://windows.php.net/downloads/releases/archives/php-7.1.9-Win32-VC14-x64.zip"},
-                "7.3": {"url": "https://windows.php.net/downloads/releases/archives/php-7.3.9-Win32-VC15-x64.zip"},
-                "7.4": {"url": "https://windows.php.net/downloads/releases/php-7.4.33-Win32-vs16-x64.zip"},
-                "8.0": {"url": "https://windows.php.net/downloads/releases/php-8.0.30-Win32-vs16-x64.zip"},
-                "8.1": {"url": "https://windows.php.net/downloads/releases/php-8.1.33-Win32-vs16-x64.zip"},
-                "8.2": {"url": "https://windows.php.net/downloads/releases/php-8.2.29-Win32-vs16-x64.zip"},
-                "8.3": {"url": "https://windows.php.net/downloads/releases/php-8.3.24-Win32-vs16-x64.zip"},
-                "8.4": {"url": "https://windows.php.net/downloads/releases/php-8.4.0-Win32-vs16-x64.zip"}
-            }
+            versions = {ver: {"url": url} for ver, url in _FALLBACK_PHP_URLS.items()}
 
         print("\n📋 Resumen de versiones Thread Safe x64 disponibles:")
         for ver in sorted(versions.keys(), key=lambda v: [int(x) for x in v.split('.')]):
@@ -3393,8 +4013,7 @@ def main():
         return
 
     if args.command:
-        manager.print_colored(f"▶️ Ejecutando: {args.command}", "cyan")
-        os.system(args.command)
+        _run_cli_command(manager, args.command)
         return
 
     # Si llega aquí, comando no reconocido
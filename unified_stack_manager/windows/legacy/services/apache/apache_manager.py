@@ -1,11 +1,17 @@
 # services/apache/apache_manager.py
 import os
+import re
 import subprocess
 from typing import List, Optional
 from ..base_service import BaseService
+from ..php.php_manager import php_short_version
 
 print("APACHE")
 
+# Líneas de httpd.conf añadidas por una configuración PHP anterior
+_PHP_LINE_RE = re.compile(r"LoadModule php_|PHPIniDir|AddType application/x-httpd-php|LoadFile")
+
+
 class ApacheManager(BaseService):
     def __init__(self, apache_root: str = "C:\\APACHE24"):
         super().__init__()
@@ -58,12 +64,14 @@ class ApacheManager(BaseService):
                 self.print_colored(f"❌ No se encontró {dll_name}", "red")
                 return False
 
+            # Apache acepta barras normales en Windows (fuera de la f-string: Python < 3.12 no admite '\\' dentro)
+            dll_conf, ini_conf, ts_conf = (p.replace("\\", "/") for p in (dll_path, php_path, ts_path))
             new_lines.extend([
                 "\n# Configuración PHP Automática\n",
-                f'LoadModule {module_name} "{dll_path.replace("\\", "/")}"\n',
+                f'LoadModule {module_name} "{dll_conf}"\n',
                 'AddType application/x-httpd-php .php\n',
-                f'PHPIniDir "{php_path.replace("\\", "/")}"\n',
-                f'LoadFile "{ts_path.replace("\\", "/")}"\n'
+                f'PHPIniDir "{ini_conf}"\n',
+                f'LoadFile "{ts_conf}"\n'
             ])
 
             temp_path = self.conf_path + ".tmp"
@@ -86,14 +94,11 @@ class ApacheManager(BaseService):
             return False
 
     def _is_php_line(self, line: str) -> bool:
-        return any(x in line for x in ["LoadModule php_", "PHPIniDir", "AddType application/x-httpd-php", "LoadFile"])
+        return _PHP_LINE_RE.search(line) is not None
 
     def _run_php_get_version(self, php_exe: str) -> Optional[str]:
-        try:
-            result = subprocess.run([php_exe, "-r", "echo substr(PHP_VERSION,0,3);"], capture_output=True, text=True)
-            return result.stdout.strip()
-        except:
-            return None
+        # Nombre de la carpeta o versión cacheada por mtime de php.exe (los fallos no se cachean)
+        return php_short_version(os.path.dirname(php_exe))
 
     def restart(self) -> bool:
         try:
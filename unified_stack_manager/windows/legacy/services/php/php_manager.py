@@ -1,24 +1,141 @@
 # services/php/php_manager.py
+import functools
+import mmap
 import os
+import re
+import shutil
+import struct
 import subprocess
+import threading
+import zipfile
+import zlib
 import requests
-from typing import Dict, Optional
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 from ..base_service import BaseService
 
 print("PHP")
 
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+DOWNLOAD_ATTEMPTS = 3
+DOWNLOAD_TIMEOUT = (5, 60)  # (conexión, lectura) en segundos
+# ZIPs grandes: varios rangos en paralelo superan el límite de ventana de una sola conexión TCP
+DOWNLOAD_SEGMENTS = 4
+SEGMENTED_DOWNLOAD_MIN_SIZE = 16 * 1024 * 1024
+# Cortes de conexión tras los que se reanuda la descarga (r.raw lanza los errores de urllib3 sin envolver)
+_RESUMABLE_ERRORS = (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, ProtocolError, ReadTimeoutError)
+EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Carpetas con la versión en el nombre (php8.3, php83): no hace falta lanzar php.exe
+_PHP_DIR_VERSION_RE = re.compile(r"^php-?(\d)\.?(\d)$", re.IGNORECASE)
+
+# snapshot.txt de los ZIP oficiales de windows.php.net incluye una línea "Version: X.Y.Z"
+_SNAPSHOT_VERSION_RE = re.compile(r'^Version:\s*(\d+\.\d+\.\d+\S*)', re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=None)
+def _inflate_function():
+    # Dependencia opcional (extra "windows"): libdeflate descomprime DEFLATE ~2x más rápido que zlib
+    try:
+        import deflate
+    except ImportError:
+        return lambda data, size: zlib.decompress(data, -15, size)
+    return deflate.deflate_decompress
+
+
+def _safe_member_parts(filename: str) -> Optional[List[str]]:
+    # Componentes de la ruta del miembro, o None si contiene '..' o una unidad ('C:'), que ZipFile.extract sanea
+    parts = filename.replace('\\', '/').split('/')
+    if '..' in parts or any(p.endswith(':') for p in parts):
+        return None
+    return parts
+
+
+def _extract_entry(inflate, view: memoryview, info: zipfile.ZipInfo, dest: str) -> None:
+    # Descomprime los bytes DEFLATE del miembro (tras su cabecera local) directamente desde el mmap, sin copiarlos;
+    # con inflate=None (ZIP_STORED) los bytes se escriben tal cual
+    header = bytes(view[info.header_offset:info.header_offset + 30])
+    if header[:4] != b'PK\x03\x04':
+        raise zipfile.BadZipFile(f"Cabecera local inválida: {info.filename}")
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    start = info.header_offset + 30 + name_len + extra_len
+    with view[start:start + info.compress_size] as compressed:
+        data = compressed if inflate is None else inflate(compressed, info.file_size)
+        if zlib.crc32(data) != info.CRC:
+            raise zipfile.BadZipFile(f"CRC incorrecto: {info.filename}")
+        with open(dest, 'wb', buffering=0) as f:
+            f.write(data)
+
+
+@functools.lru_cache(maxsize=32)
+def _read_php_version(php_path: str, mtime: float) -> str:
+    # La mtime de php.exe forma parte de la clave: una reinstalación invalida la caché.
+    # Los fallos (OSError, SubprocessError) se propagan para que lru_cache no los guarde
+    try:
+        with open(os.path.join(php_path, "snapshot.txt"), encoding='utf-8', errors='replace') as f:
+            match = _SNAPSHOT_VERSION_RE.search(f.read(4096))
+        if match:
+            return match.group(1)
+    except OSError:
+        pass
+
+    result = subprocess.run(
+        [os.path.join(php_path, "php.exe"), "-r", "echo PHP_VERSION;"],
+        capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+def php_short_version(php_path: str) -> Optional[str]:
+    # Versión "X.Y" de una instalación: por el nombre de la carpeta o, si no, por la versión completa
+    match = _PHP_DIR_VERSION_RE.match(os.path.basename(os.path.normpath(php_path)))
+    if match:
+        return f"{match.group(1)}.{match.group(2)}"
+    try:
+        version = _read_php_version(php_path, os.path.getmtime(os.path.join(php_path, "php.exe")))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return ".".join(version.split(".")[:2]) or None
+
+
 class PHPManager(BaseService):
     def __init__(self, base_path: str = "C:\\"):
         super().__init__()
         self.base_path = base_path
         self.available_versions = {
-            "7.4": f"{base_path}php7.4",
-            "8.0": f"{base_path}php8.0",
-            "8.1": f"{base_path}php8.1",
-            "8.2": f"{base_path}php8.2",
-            "8.3": f"{base_path}php8.3",
-            "8.4": f"{base_path}php8.4",
+            v: os.path.join(base_path, f"php{v}") for v in ("7.4", "8.0", "8.1", "8.2", "8.3", "8.4")
         }
+        self._installed: Optional[Dict[str, bool]] = None
+        # Sesión compartida: las conexiones keep-alive se reutilizan entre versiones y segmentos de descarga
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=4, pool_maxsize=8, max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self) -> "PHPManager":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _is_installed(self, version: str) -> bool:
+        # Un solo listado de base_path en lugar de un stat por versión
+        if self._installed is None:
+            try:
+                names = {os.path.normcase(entry.name) for entry in os.scandir(self.base_path)}
+            except OSError:
+                names = set()
+            self._installed = {
+                v: os.path.normcase(os.path.basename(p)) in names for v, p in self.available_versions.items()
+            }
+        return self._installed[version]
 
     def install_version(self, version: str, force: bool = False) -> bool:
         if version not in self.available_versions:
@@ -26,7 +143,7 @@ class PHPManager(BaseService):
             return False
 
         php_path = self.available_versions[version]
-        if os.path.exists(php_path) and not force:
+        if not force and self._is_installed(version):
             self.print_colored(f"✅ PHP {version} ya instalado", "green")
             return True
 
@@ -34,11 +151,49 @@ class PHPManager(BaseService):
         if not url:
             return False
 
-        zip_path = os.path.join(self.base_path, f"php-{version}.zip")
-        if not self._download_file(url, zip_path):
-            return False
+        # Los borrados de árboles antiguos van a un hilo aparte y se solapan con la descarga y la extracción
+        with ThreadPoolExecutor(max_workers=1) as cleaner:
+            # Reinstalación: apartar la instalación anterior (renombrar es instantáneo) y recuperarla si algo falla
+            stale_path = None
+            if os.path.exists(php_path):
+                stale_path = f"{php_path}.old"
+                try:
+                    if os.path.exists(stale_path):
+                        # Restos de una reinstalación interrumpida: renombrarlos y borrarlos en segundo plano
+                        leftover = f"{stale_path}.{os.getpid()}"
+                        os.replace(stale_path, leftover)
+                        cleaner.submit(shutil.rmtree, leftover, True)
+                    os.replace(php_path, stale_path)
+                except OSError as e:
+                    # Típico en Windows: Apache o php-cgi mantienen abiertas las DLL de PHP
+                    self.print_colored(f"❌ No se pudo apartar la instalación de PHP {version}: {e}", "red")
+                    return False
+
+            zip_path = os.path.join(self.base_path, f"php-{version}.zip")
+            installed = self._download_file(url, zip_path) and self._extract_php(zip_path, php_path)
+            if stale_path:
+                if installed:
+                    cleaner.submit(shutil.rmtree, stale_path, True)
+                else:
+                    self._restore_previous(stale_path, php_path)
+        if self._installed is not None:
+            # Lo que hay en disco: tras un fallo puede haberse restaurado la instalación anterior
+            self._installed[version] = installed or os.path.exists(os.path.join(php_path, "php.exe"))
+        return installed
 
-        return self._extract_php(zip_path, php_path)
+    def _restore_previous(self, stale_path: str, php_path: str) -> None:
+        try:
+            # Quitar los restos de una extracción fallida antes de devolver la instalación anterior a su sitio
+            shutil.rmtree(php_path, ignore_errors=True)
+            os.replace(stale_path, php_path)
+        except OSError as e:
+            self.print_colored(f"⚠️ No se pudo restaurar la instalación anterior desde {stale_path}: {e}", "yellow")
+
+    def install_many(self, versions: List[str], force: bool = False) -> Dict[str, bool]:
+        # Descargas simultáneas (requests libera el GIL durante la E/S de red); cada versión usa su propio directorio
+        with ThreadPoolExecutor(max_workers=max(1, len(versions))) as pool:
+            results = pool.map(lambda v: self.install_version(v, force), versions)
+            return dict(zip(versions, results))
 
     def _get_download_url(self, version: str) -> Optional[str]:
         # Use web scraping or fallback
@@ -46,34 +201,149 @@ class PHPManager(BaseService):
         pass
 
     def _download_file(self, url: str, dest: str) -> bool:
+        if not os.path.exists(dest) and self._download_segmented(url, dest):
+            return True
+
+        # Si la conexión se corta, el siguiente intento continúa desde lo ya descargado (cabecera Range)
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            try:
+                offset = os.path.getsize(dest) if os.path.exists(dest) else 0
+                headers = {'Range': f'bytes={offset}-'} if offset else {}
+                with self._session.get(url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT) as r:
+                    if r.status_code == 416:
+                        # El parcial no encaja con el archivo remoto: empezar de cero
+                        os.remove(dest)
+                        continue
+                    r.raise_for_status()
+                    # 206: el servidor acepta el rango; 200: lo ignora y hay que sobrescribir
+                    resumed = r.status_code == 206
+                    # Copia continua desde el socket (descomprimiendo gzip/deflate si aplica)
+                    r.raw.decode_content = True
+                    with open(dest, 'r+b' if resumed else 'wb') as f:
+                        f.seek(offset if resumed else 0)
+                        # Reservar el tamaño final de una vez (SetEndOfFile) en lugar de ampliar el archivo en cada escritura
+                        length = int(r.headers.get('Content-Length', 0))
+                        if length and 'Content-Encoding' not in r.headers:
+                            f.truncate(f.tell() + length)
+                        try:
+                            shutil.copyfileobj(r.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+                        finally:
+                            # Recortar a lo escrito: la reanudación usa el tamaño del parcial como desplazamiento
+                            f.truncate(f.tell())
+                return True
+            except _RESUMABLE_ERRORS as e:
+                if attempt == DOWNLOAD_ATTEMPTS - 1:
+                    self.print_colored(f"❌ Error descargando: {e}", "red")
+                else:
+                    self.print_colored(f"⚠️ Conexión interrumpida, reanudando descarga... ({e})", "yellow")
+            except Exception as e:
+                self.print_colored(f"❌ Error descargando: {e}", "red")
+                return False
+        return False
+
+    def _download_segmented(self, url: str, dest: str) -> bool:
+        try:
+            head = self._session.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+            total = int(head.headers.get('Content-Length', 0))
+            if head.headers.get('Accept-Ranges') != 'bytes' or total < SEGMENTED_DOWNLOAD_MIN_SIZE:
+                return False
+        except Exception:
+            return False
+
+        step = -(-total // DOWNLOAD_SEGMENTS)
+
+        def fetch(start):
+            end = min(start + step, total) - 1
+            headers = {'Range': f'bytes={start}-{end}'}
+            with self._session.get(head.url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT) as r:
+                if r.status_code != 206:
+                    raise requests.HTTPError(f"el servidor ignoró el rango (HTTP {r.status_code})")
+                # Un descriptor por segmento (os.pwrite no existe en Windows)
+                with open(dest, 'r+b') as f:
+                    f.seek(start)
+                    shutil.copyfileobj(r.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+
         try:
-            with requests.get(url, stream=True) as r:
-                r.raise_for_status()
-                with open(dest, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
+            with open(dest, 'wb') as f:
+                f.truncate(total)
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_SEGMENTS) as pool:
+                list(pool.map(fetch, range(0, total, step)))
             return True
         except Exception as e:
-            self.print_colored(f"❌ Error descargando: {e}", "red")
+            self.print_colored(f"⚠️ Descarga por segmentos fallida, usando una sola conexión: {e}", "yellow")
+            if os.path.exists(dest):
+                os.remove(dest)
             return False
 
     def _extract_php(self, zip_path: str, php_path: str) -> bool:
         try:
-            import zipfile
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(php_path)
+            self._extract_parallel(zip_path, php_path)
             os.remove(zip_path)
             return bool(os.path.exists(os.path.join(php_path, "php.exe")))
         except Exception as e:
             self.print_colored(f"❌ Error al descomprimir: {e}", "red")
+            # ZIP completo pero inválido: descartarlo para que la próxima instalación no intente reanudarlo
+            try:
+                os.remove(zip_path)
+            except OSError:
+                pass
             return False
 
+    def _extract_parallel(self, zip_path: str, php_path: str) -> None:
+        with open(zip_path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            self._extract_mapped(mm, zip_path, php_path)
+
+    def _extract_mapped(self, mm: mmap.mmap, zip_path: str, php_path: str) -> None:
+        with zipfile.ZipFile(mm, 'r') as zip_ref:
+            infos = zip_ref.infolist()
+
+        # Crear antes los directorios para que los hilos no compitan en makedirs
+        # (los nombres con '..' o unidades se dejan a ZipFile.extract, que los sanea)
+        for info in infos:
+            parts = _safe_member_parts(info.filename)
+            if parts is not None:
+                os.makedirs(os.path.join(php_path, *parts[:-1]), exist_ok=True)
+
+        # Índice del directorio central: cada miembro DEFLATE se descomprime de forma independiente a partir
+        # de su cabecera local. Todos los hilos leen del mismo mmap mediante cortes, sin posición compartida
+        view = memoryview(mm)
+        local = threading.local()
+        handles = []
+        lock = threading.Lock()
+        inflate = _inflate_function()
+
+        def open_handle(name, factory):
+            handle = getattr(local, name, None)
+            if handle is None:
+                handle = factory()
+                setattr(local, name, handle)
+                with lock:
+                    handles.append(handle)
+            return handle
+
+        def extract(info):
+            parts = _safe_member_parts(info.filename)
+            if (parts is not None and info.compress_type in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED)
+                    and not info.flag_bits & 0x1):
+                member_inflate = inflate if info.compress_type == zipfile.ZIP_DEFLATED else None
+                _extract_entry(member_inflate, view, info, os.path.join(php_path, *parts))
+            else:
+                # Cifrados, otros métodos o nombres a sanear: ZipFile.extract
+                open_handle('zip_ref', lambda: zipfile.ZipFile(zip_path, 'r')).extract(info, php_path)
+
+        # Los miembros más grandes primero: ninguno grande queda para el final con el resto de hilos ociosos
+        members = sorted((info for info in infos if not info.is_dir()), key=lambda i: i.compress_size, reverse=True)
+        try:
+            with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as pool:
+                list(pool.map(extract, members))
+        finally:
+            view.release()
+            for handle in handles:
+                handle.close()
+
     def get_version(self, php_path: str) -> Optional[str]:
         try:
-            result = subprocess.run(
-                [os.path.join(php_path, "php.exe"), "-r", "echo PHP_VERSION;"],
-                capture_output=True, text=True, check=True
-            )
-            return result.stdout.strip()
-        except:
+            mtime = os.path.getmtime(os.path.join(php_path, "php.exe"))
+            return _read_php_version(php_path, mtime)
+        except (OSError, subprocess.SubprocessError):
             return None
\ No newline at end of file